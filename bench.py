@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+"""Offline end-to-end benchmark for the voice keyboard client.
+
+Replays WAV files through the same path as a live session (ring buffer,
+VAD, pipeline, keep-alive upload, transcript cleanup) against a local
+stand-in for whisper-server, and "types" into a null keyboard sink. No
+microphone, model or GPU is needed, so it runs on any CI-like box.
+
+    python3 bench.py recordings/*.wav --latency 150 --workers 2
+    python3 bench.py --synth 20
+    python3 bench.py --synth 20 --formats wav,flac,mp3 [--server 7654]
+"""
+import argparse
+import array
+import glob
+import http.server
+import io
+import json
+import math
+import random
+import resource
+import subprocess
+import sys
+import threading
+import time
+import wave
+
+import client
+
+
+class FakeWhisperServer:
+    """Local HTTP stand-in for whisper-server's /inference endpoint.
+
+    Each request sleeps for `latency` seconds plus `rtf` times the audio
+    length, then answers with numbered canned text. verbose_json requests also get
+    a segment whose avg_logprob is low for a `low_confidence` fraction.
+    """
+
+    def __init__(self, latency=0.1, rtf=0.0, text="the quick brown fox jumps over the lazy dog",
+                 low_confidence=0.0):
+        self.latency = latency
+        self.rtf = rtf
+        self.text = text
+        self.low_confidence = low_confidence
+        self.rng = random.Random(1)
+        self.requests = 0
+        self.bytes_received = 0
+        self.lock = threading.Lock()
+        self.httpd = None
+
+    def start(self, port=0):
+        fake = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # Keep-alive, like whisper-server
+
+            def do_GET(self):
+                self.reply(b"")
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = self.rfile.read(length)
+                with fake.lock:
+                    fake.requests += 1
+                    fake.bytes_received += length
+                    number = fake.requests
+                audio_seconds = max(0, len(body) - 44) / float(client.SAMPLE_RATE * client.SAMPLE_WIDTH)
+                time.sleep(fake.latency + fake.rtf * audio_seconds)
+                # Numbered, so chunk stitching never mistakes replies for overlap
+                response = {"text": f" {fake.text} {number}\n"}
+                if b"verbose_json" in body[:1024]:
+                    with fake.lock:
+                        low = fake.rng.random() < fake.low_confidence
+                    response["segments"] = [{"text": response["text"], "avg_logprob": -1.5 if low else -0.3}]
+                self.reply(json.dumps(response).encode())
+
+            def reply(self, data):
+                try:
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                except OSError:
+                    self.close_connection = True  # Client gave up (deadline/cancel)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = http.server.ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.httpd.daemon_threads = True
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self.httpd.server_address[1]
+
+    def stop(self):
+        if self.httpd:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+
+
+class NullKeyboard:
+    """Typing sink that only counts what would have been typed"""
+
+    def __init__(self):
+        self.chars = 0
+        self.texts = []
+
+    def type(self, text):
+        self.chars += len(text)
+        self.texts.append(text)
+
+
+def synth_utterances(count, seed=0, max_seconds=6.0):
+    """Tone bursts of 0.5-max_seconds separated by 1-2 s of low noise, as one PCM stream"""
+    rng = random.Random(seed)
+    rate = client.SAMPLE_RATE
+    samples = array.array("h")
+    for _ in range(count):
+        for _ in range(int(rate * rng.uniform(1.0, 2.0))):
+            samples.append(int(rng.uniform(-60, 60)))
+        freq = rng.uniform(120, 300)
+        for i in range(int(rate * rng.uniform(0.5, max_seconds))):
+            samples.append(int(6000 * math.sin(2 * math.pi * freq * i / rate)))
+    for _ in range(rate):
+        samples.append(0)
+    return samples.tobytes()
+
+
+def decode(data, fmt):
+    """Decode an uploaded file back to PCM, standing in for the server's decoder"""
+    if fmt == "wav":
+        with wave.open(io.BytesIO(data), "rb") as w:
+            return w.readframes(w.getnframes())
+    cmd = [
+        "sox", "-t", client.WIRE_FORMATS[fmt][0], "-", "-t", "raw", "-r", str(client.SAMPLE_RATE),
+        "-e", "signed-integer", "-b", str(client.SAMPLE_WIDTH * 8), "-c", "1", "-",
+    ]
+    result = subprocess.run(cmd, input=data, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        raise OSError(f"sox could not decode {fmt}: {result.stderr.decode(errors='replace').strip()}")
+    return result.stdout
+
+
+def format_benchmark(streams, formats, server_port=None, seconds=5.0):
+    """Encode time, upload size and decode time per wire format.
+
+    Decoding is timed locally (WAV in-process, the rest with sox) as a
+    stand-in for the server. With server_port, each file is also sent to
+    a real whisper-server, whose round trip includes its own decoding.
+    """
+    bytes_per_second = client.SAMPLE_RATE * client.SAMPLE_WIDTH
+    chunk = int(seconds * bytes_per_second)
+    segments = [
+        client.AudioSegment(pcm[offset:offset + chunk])
+        for _, pcm in streams
+        for offset in range(0, len(pcm), chunk)
+        if len(pcm) - offset >= bytes_per_second // 2
+    ]
+    audio_seconds = sum(segment.duration for segment in segments)
+    inference = client.InferenceClient("127.0.0.1", server_port) if server_port else None
+
+    lines = [
+        f"{len(segments)} segments, {audio_seconds:.1f}s of audio, up to {seconds:g}s each",
+        "",
+        f"{'format':<8}{'encode ms':>10}{'bytes/s':>10}{'vs wav':>8}{'decode ms':>11}"
+        + (f"{'server ms':>11}" if inference else ""),
+    ]
+    wav_rate = None
+    for fmt in formats:
+        encode_time = decode_time = server_time = 0.0
+        size = 0
+        try:
+            for segment in segments:
+                start = time.perf_counter()
+                parts, filename, content_type = segment.encode(fmt)
+                encode_time += time.perf_counter() - start
+                size += sum(len(part) for part in parts)
+                data = b"".join(parts)
+                start = time.perf_counter()
+                decode(data, fmt)
+                decode_time += time.perf_counter() - start
+                if inference:
+                    start = time.perf_counter()
+                    inference.infer(parts, filename, content_type=content_type)
+                    server_time += time.perf_counter() - start
+        except OSError as e:
+            lines.append(f"{fmt:<8}n/a: {e}")
+            continue
+        rate = size / audio_seconds
+        if fmt == "wav":
+            wav_rate = rate
+        ratio = f"{rate / wav_rate:.2f}" if wav_rate else "-"
+        count = float(len(segments))
+        line = (
+            f"{fmt:<8}{encode_time / count * 1000:>10.2f}{rate:>10.0f}{ratio:>8}"
+            f"{decode_time / count * 1000:>11.2f}"
+        )
+        if inference:
+            line += f"{server_time / count * 1000:>11.0f}"
+        lines.append(line)
+    if inference:
+        inference.close()
+    return "\n".join(lines)
+
+
+def replay(pcm, ring, vad, pipeline, realtime=False, backlog=None, chunk=4096):
+    """Feed PCM through the ring, VAD and chunker like VoiceTypingGUI.on_audio does.
+
+    Faster than real time, submitting waits while `backlog` segments are
+    queued, so utterances are not merged by the overflow policy and each
+    one's latency is measured on its own. Returns the number of segments
+    submitted.
+    """
+    vad.reset(ring.position)
+    chunker = client.UtteranceChunker(ring)
+    bytes_per_second = float(client.SAMPLE_RATE * client.SAMPLE_WIDTH)
+    count = 0
+
+    def submit(piece):
+        segment, _, end = piece
+        if not realtime and backlog:
+            pipeline.wait_pending(backlog)
+        now = time.monotonic()
+        if realtime:
+            segment.mark("speech_end", now - (ring.position - end) / bytes_per_second)
+        else:
+            segment.mark("speech_end", now)
+        segment.mark("endpoint", now)
+        pipeline.submit(segment)
+
+    for offset in range(0, len(pcm), chunk):
+        data = pcm[offset:offset + chunk]
+        ring.write(data)
+        events = vad.feed(data)
+        if offset + chunk >= len(pcm):
+            events += vad.flush()
+        for kind, pos in events:
+            if kind == "start":
+                chunker.begin(pos)
+                continue
+            piece = chunker.end(pos)
+            if piece:
+                submit(piece)
+                count += 1
+        piece = chunker.poll()
+        if piece:
+            submit(piece)
+            count += 1
+        if realtime:
+            time.sleep(len(data) / bytes_per_second)
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline end-to-end client benchmark")
+    parser.add_argument("inputs", nargs="*", help="WAV files or glob patterns")
+    parser.add_argument("--synth", type=int, default=0, metavar="N",
+                        help="add N synthetic utterances (used when no inputs are given)")
+    parser.add_argument("--synth-max", type=float, default=6.0, metavar="SECONDS",
+                        help="longest synthetic utterance; above CHUNK_MAX_SECONDS they are chunked")
+    parser.add_argument("--latency", type=float, default=100, help="fake server latency per request in ms")
+    parser.add_argument("--rtf", type=float, default=0.05, help="fake server seconds per audio second")
+    parser.add_argument("--workers", type=int, default=client.INFERENCE_WORKERS)
+    parser.add_argument("--max-pending", type=int, default=client.MAX_PENDING_SEGMENTS,
+                        help="pipeline backlog before the overflow policy applies")
+    parser.add_argument("--realtime", action="store_true", help="replay at microphone speed")
+    parser.add_argument("--deadline", type=float, default=client.SEGMENT_DEADLINE_SECONDS,
+                        help="seconds a segment may take before it is abandoned (0 = none)")
+    parser.add_argument("--route", type=float, metavar="SECONDS",
+                        help="route segments up to SECONDS to a second, faster fake server")
+    parser.add_argument("--small-speedup", type=float, default=4.0,
+                        help="how much faster the small fake server is")
+    parser.add_argument("--low-confidence", type=float, default=0.1,
+                        help="fraction of small-server results below the fallback threshold")
+    parser.add_argument("--output", help="also write the report to this file")
+    parser.add_argument("--format", default=client.WIRE_FORMAT, choices=sorted(client.WIRE_FORMATS),
+                        help="upload format for the end-to-end run")
+    parser.add_argument("--formats", metavar="LIST",
+                        help="instead of the end-to-end run, compare comma-separated wire formats")
+    parser.add_argument("--server", type=int, metavar="PORT",
+                        help="with --formats, also time a real whisper-server on this port")
+    args = parser.parse_args()
+
+    paths = []
+    for pattern in args.inputs:
+        paths.extend(sorted(glob.glob(pattern)) or [pattern])
+    streams = [(path, client.load_audio(path)) for path in paths]
+    if args.synth or not streams:
+        streams.append(("<synthetic>", synth_utterances(args.synth or 20, max_seconds=args.synth_max)))
+
+    if args.formats:
+        formats = [fmt.strip() for fmt in args.formats.split(",")]
+        unknown = [fmt for fmt in formats if fmt not in client.WIRE_FORMATS]
+        if unknown:
+            parser.error(f"unknown format(s) {', '.join(unknown)}; choose from {', '.join(client.WIRE_FORMATS)}")
+        report = format_benchmark(streams, formats, args.server)
+        print(report)
+        if args.output:
+            with open(args.output, "w") as f:
+                f.write(report + "\n")
+        return
+
+    server = FakeWhisperServer(latency=args.latency / 1000.0, rtf=args.rtf)
+    port = server.start()
+    pool = client.ServerPool(port, count=1)
+    servers = [server]
+    if args.route is not None:
+        small_server = FakeWhisperServer(
+            latency=args.latency / 1000.0 / args.small_speedup, rtf=args.rtf / args.small_speedup,
+            low_confidence=args.low_confidence,
+        )
+        small = client.ServerPool(small_server.start(), count=1)
+        pool = client.ModelRouter(pool, small, max_seconds=args.route)
+        servers.append(small_server)
+    for instance in pool.instances:
+        instance.healthy = True
+    # The GUI's transcription core, minus the supervisor's launching: the
+    # fake servers are up already and nothing calls service.start()
+    loop = client.EventLoop()
+    loop.start()
+
+    def on_status(text):
+        print(text, end="", file=sys.stderr)
+
+    service = client.TranscriptionService(loop, on_status=on_status, pool=pool)
+    service.wire_format = args.format
+    service.servers_changed()
+    tracer = client.LatencyTracer()
+    keyboard = NullKeyboard()
+
+    def commit(segment, text):
+        segment.mark("committed")
+        keyboard.type(text)
+        segment.mark("typed")
+        tracer.finish(segment)
+
+    ring = client.PCMRingBuffer(client.RING_SECONDS * client.SAMPLE_RATE * client.SAMPLE_WIDTH)
+    vad = client.VoiceActivityDetector()
+    gate = client.SegmentGate(vad)
+    pipeline = client.TranscriptionPipeline(
+        service.transcribe, commit, on_status=on_status,
+        workers=args.workers, max_pending=args.max_pending, gate=gate,
+        deadline=args.deadline or None,
+    )
+
+    start = time.monotonic()
+    audio_seconds = 0.0
+    segments = 0
+    for _, pcm in streams:
+        audio_seconds += len(pcm) / float(client.SAMPLE_RATE * client.SAMPLE_WIDTH)
+        segments += replay(pcm, ring, vad, pipeline, realtime=args.realtime, backlog=args.max_pending)
+    pipeline.wait_idle()
+    wall = time.monotonic() - start
+    loop.stop()
+    for fake in servers:
+        fake.stop()
+    requests = sum(fake.requests for fake in servers)
+    bytes_received = sum(fake.bytes_received for fake in servers)
+
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+    report = "\n".join([
+        f"inputs            {len(streams)} ({', '.join(name for name, _ in streams)})",
+        f"audio             {audio_seconds:.1f}s",
+        f"wall clock        {wall:.2f}s ({audio_seconds / wall:.1f}x real time)",
+        f"segments          {segments} ({segments / wall:.2f}/s, {pipeline.merged} merged, "
+        f"{pipeline.dropped} dropped, {pipeline.cancelled} cancelled, {pipeline.timed_out} timed out)",
+        f"gate              {gate.summary()}",
+        f"requests          {requests}",
+        f"bytes uploaded    {bytes_received} ({bytes_received / max(requests, 1):.0f}/request)",
+        f"chars typed       {keyboard.chars}",
+        f"peak RSS          {peak_rss_mb:.1f} MB",
+        "",
+        tracer.summary(),
+    ] + (["", pool.summary()] if args.route is not None else []))
+    print(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report + "\n")
+
+
+if __name__ == "__main__":
+    main()
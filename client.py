@@ -1,66 +1,2720 @@
 #!/usr/bin/env python3
-import tkinter as tk
-from tkinter import ttk
-import tkinter.font as tkfont  # Correct import for font module
-import pty
+import time
+IMPORT_START = time.perf_counter()
 import os
 import threading
 import signal
 import re
-import time
 import queue
 import json
-import pynput
 import socket
 import sys
-import http.client
-import urllib.parse
-from urllib.request import Request, urlopen
-import fnmatch
+import glob
+import itertools
+import collections
+import operator
+import math
+import heapq
+import selectors
+import errno
+import struct
+import argparse
+import array
+import warnings
+import shutil
+import subprocess
+import wave
+
+with warnings.catch_warnings():
+    warnings.simplefilter("ignore", DeprecationWarning)
+    try:
+        import audioop  # C speed-ups; deprecated in 3.11, gone in 3.13
+    except ImportError:
+        audioop = None
+
+# tkinter and http.client are imported on first use (import_tk and
+# import_http): commands sent to a running instance need neither, and the
+# window should not wait for them
+tk = ttk = tkfont = None
+http = None
+
+
+def import_tk():
+    global tk, ttk, tkfont
+    import tkinter as tk
+    from tkinter import ttk
+    import tkinter.font as tkfont  # Correct import for font module
+
+
+def import_http():
+    global http
+    import http.client
 MODEL = "large-v3-turbo-q8_0"
 SERVER_PORT = 7654
-SINGLETON_PORT = 45678  # Choose an unused port
+# Later invocations reach the running instance over this per-user AF_UNIX
+# socket. Its directory is private (0700), so other local users can
+# neither send commands nor keep voicekbd from starting.
+SINGLETON_SOCKET = os.path.join(
+    os.environ.get("XDG_RUNTIME_DIR") or f"/tmp/voicekbd-{os.getuid()}", "voicekbd.sock"
+)
+
+# Commands a running instance accepts on SINGLETON_SOCKET
+COMMANDS = ("show", "hide", "start", "stop", "toggle", "discard", "quit")
+# In daemon mode Escape/close only hide the window and keep the process warm
+DAEMON_MODE = False
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+WHISPER_SERVER_PATH = f"{PROJECT_ROOT}/whisper.cpp/build/bin/whisper-server"
+WHISPER_MODEL_PATH = f"{PROJECT_ROOT}/whisper.cpp/models/ggml-{MODEL}.bin"
+
+# Voice activity threshold: frame RMS in percent of full scale
+THRESH_START = 2.0
+# Silence needed to end an utterance; can go down to a few hundred ms
+END_SILENCE_MS = 800
+# Speech needed to open an utterance
+VAD_START_MS = 150
+# Audio kept before the detected start so the first syllable isn't clipped
+PREROLL_MS = 300
+# Trailing silence kept after the last speech frame
+VAD_TRAIL_MS = 200
+VAD_FRAME_MS = 30
+# Broadband noise crosses zero much more often than voiced speech
+VAD_MAX_ZCR = 0.35
+# Utterances longer than CHUNK_MAX_SECONDS are cut while still being
+# spoken, at the quietest frame of the last CHUNK_SEARCH_SECONDS, so
+# continuous dictation is typed as it goes. Neighbouring chunks share
+# CHUNK_OVERLAP_SECONDS of audio; the words repeated there are dropped.
+CHUNK_MAX_SECONDS = 12.0
+CHUNK_SEARCH_SECONDS = 3.0
+CHUNK_OVERLAP_SECONDS = 1.0
+
+# Capture format: raw signed 16-bit mono PCM streamed from rec's stdout.
+# 16 kHz is what whisper consumes, so the server never has to resample.
+SAMPLE_RATE = 16000
+SAMPLE_WIDTH = 2
+# Upload format, a key of WIRE_FORMATS. "wav" wraps the captured PCM in a
+# header built in-process, which is what whisper.cpp consumes natively.
+# "flac" and "mp3" are encoded with sox: fewer bytes on the wire, but
+# CPU on both ends. Compare them with `bench.py --formats`.
+WIRE_FORMAT = "wav"
+# How much recent audio the in-memory ring buffer keeps
+RING_SECONDS = 300
+
+# Streaming mode: re-transcribe the live utterance while the user speaks
+STREAMING_MODE = False
+STREAM_INTERVAL_MS = 500
+# Only the most recent part of a long utterance is sent on each tick
+STREAM_WINDOW_SECONDS = 15
+# Also type the unstable tail and fix it up with backspaces later
+STREAM_TYPE_PROVISIONAL = False
+
+# Server pool: SERVER_INSTANCES whisper-servers on consecutive ports from
+# SERVER_PORT, each with SERVER_THREADS threads (None = whisper default).
+# With SERVER_CPU_AFFINITY each instance is pinned to its own cores.
+SERVER_INSTANCES = 1
+SERVER_THREADS = None
+SERVER_CPU_AFFINITY = False
+# `client.py calibrate` saves the fastest threads/processors/beam size for
+# each model here, and every server launch uses them. SERVER_THREADS, when
+# set, still wins for the thread count; with several instances (counting
+# the small model's server in ROUTING_MODE) the calibrated count is capped
+# at each one's share of the cores.
+SERVER_CONFIG_FILE = os.path.join(
+    os.environ.get("XDG_CONFIG_HOME") or os.path.expanduser("~/.config"), "voicekbd", "server.json"
+)
+# Seconds an instance is skipped after a failed request
+SERVER_RETRY_SECONDS = 5.0
+
+# Routing: with ROUTING_MODE a second pool serves SMALL_MODEL from
+# SMALL_SERVER_PORT, and segments up to ROUTE_MAX_SECONDS go there. Short
+# commands then skip the large model's per-request cost.
+ROUTING_MODE = False
+SMALL_MODEL = "base.en-q5_1"
+SMALL_MODEL_PATH = f"{PROJECT_ROOT}/whisper.cpp/models/ggml-{SMALL_MODEL}.bin"
+SMALL_SERVER_PORT = SERVER_PORT + 100
+ROUTE_MAX_SECONDS = 3.0
+# Re-run a small-model result on the large model when it is empty or its
+# mean avg_logprob is below this; None only falls back on empty results
+ROUTE_FALLBACK_LOGPROB = -0.8
+
+# Calibration: the audio replayed (files, directories or globs), the grid
+# tried (None = powers of two up to the CPU count) and the timed passes
+# per setting. Settings whose transcripts differ from the reference
+# setting's by more than CALIBRATE_MAX_WER (word error rate) never win.
+CALIBRATE_AUDIO = [f"{PROJECT_ROOT}/whisper.cpp/samples/jfk.wav"]
+CALIBRATE_THREADS = None
+CALIBRATE_PROCESSORS = [1, 2]
+CALIBRATE_BEAM_SIZES = [1, 5]
+CALIBRATE_ROUNDS = 3
+CALIBRATE_MAX_WER = 0.05
+
+# How long to wait for a freshly launched whisper-server to come up
+SERVER_START_TIMEOUT = 30.0
+# Length of the silent clip sent once the server is up to page in the model
+WARMUP_SECONDS = 0.5
+
+# Supervision: idle servers are health-checked every SERVER_HEALTH_INTERVAL
+# seconds. One we launched is restarted after SERVER_HEALTH_FAILURES missed
+# checks or a crash, backing off from 1 s up to SERVER_RESTART_MAX_DELAY.
+# SERVER_MAX_RESTARTS restarts in a row give up on it.
+SERVER_HEALTH_INTERVAL = 10.0
+SERVER_HEALTH_FAILURES = 3
+SERVER_RESTART_MAX_DELAY = 60.0
+SERVER_MAX_RESTARTS = 5
+# Stop the server (and free the model's memory) after this many seconds
+# without requests; None keeps it loaded. Start/toggle or the next speech
+# segment brings it back.
+SERVER_IDLE_SECONDS = 600
+# Each client holds a lease file per server port while it uses it. A
+# server is only stopped once no other live client holds a lease.
+SERVER_LEASE_DIR = f"/tmp/voicekbd-{os.getuid()}"
+
+# How transcripts are typed: "auto", "pynput", "xdotool" or "clipboard".
+# "auto" pastes long text and types short text with xdotool (or pynput).
+TYPING_STRATEGY = "auto"
+PASTE_MIN_CHARS = 200
+XDOTOOL_DELAY_MS = 2
+# Per-application overrides keyed by lowercase X window class
+TYPING_APP_STRATEGY = {}
+
+# Pre-inference gate: segments that are too short, too quiet or contain
+# too few speech frames never reach the server
+GATE_MIN_SECONDS = 0.3
+GATE_MIN_RMS = 0.5  # Percent of full scale over the whole segment
+GATE_MIN_SPEECH_RATIO = 0.1  # Fraction of VAD frames above the threshold
+
+# Segments transcribed concurrently
+INFERENCE_WORKERS = 2
+# Segments allowed to wait for a worker before OVERFLOW_POLICY kicks in:
+# "merge" appends new audio to the newest waiting segment,
+# "drop-oldest" / "drop-newest" discard a segment
+MAX_PENDING_SEGMENTS = 8
+OVERFLOW_POLICY = "merge"
+
+# Latency tracing: keep the last TRACE_RING_SIZE segments in memory and,
+# if TRACE_FILE is set, append each one to it as a JSON line
+TRACE_RING_SIZE = 500
+TRACE_FILE = None
+
+# Inference HTTP client timeouts in seconds
+CONNECT_TIMEOUT = 2.0
+READ_TIMEOUT = 60.0
+# A segment not transcribed within this many seconds of being queued is
+# abandoned (its request aborted) so newer speech is not stuck behind it;
+# None waits forever
+SEGMENT_DEADLINE_SECONDS = 20.0
+
+FONT_SIZE = 12
+# First of these that is installed becomes the UI font. The choice is
+# cached in FONT_CACHE_FILE so startup never enumerates every installed
+# font; delete the file after installing or removing fonts.
+PREFERRED_FONTS = ["helvetica"]
+FONT_CACHE_FILE = os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "voicekbd", "font.json"
+)
+# --profile-startup prints a phase timing breakdown; hotkey-to-window
+# should stay under STARTUP_BUDGET_MS
+PROFILE_STARTUP = False
+STARTUP_BUDGET_MS = 150
+# Input level meter: dBFS shown as 0% at METER_FLOOR_DB up to 100% at 0 dBFS
+METER_FLOOR_DB = -60.0
+# Samples at or beyond this magnitude count as clipped
+CLIP_LEVEL = 32767
+
+# UI repaint rate and how many lines the text panes keep
+UI_FPS = 15
+UI_MAX_LINES = 500
+# Echo status and transcripts to the console as well
+CONSOLE_ECHO = True
+
+
+class PCMRingBuffer:
+    """Fixed-size in-memory ring of raw PCM bytes addressed by absolute stream position"""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.buf = bytearray(capacity)
+        self.position = 0  # Total bytes ever written
+        self.lock = threading.Lock()
+
+    def write(self, data):
+        with self.lock:
+            data = memoryview(data)
+            if len(data) > self.capacity:
+                # Only the tail can survive anyway
+                self.position += len(data) - self.capacity
+                data = data[-self.capacity:]
+            offset = self.position % self.capacity
+            first = min(len(data), self.capacity - offset)
+            self.buf[offset:offset + first] = data[:first]
+            self.buf[:len(data) - first] = data[first:]
+            self.position += len(data)
+
+    def read(self, start, end):
+        """Return bytes in [start, end); the part already overwritten is dropped"""
+        with self.lock:
+            start = max(start, self.position - self.capacity, 0)
+            end = min(end, self.position)
+            if end <= start:
+                return b""
+            a = start % self.capacity
+            b = a + (end - start)
+            if b <= self.capacity:
+                return bytes(self.buf[a:b])
+            return bytes(self.buf[a:]) + bytes(self.buf[:b - self.capacity])
+
+
+class AudioSegment:
+    """One captured utterance kept in memory as raw PCM"""
+
+    def __init__(self, pcm, sample_rate=SAMPLE_RATE, sample_width=SAMPLE_WIDTH):
+        self.seq = None  # Assigned when the segment enters the pipeline
+        self.pcm = pcm
+        self.sample_rate = sample_rate
+        self.sample_width = sample_width
+        self.created = time.time()
+        self.marks = {}  # Stage name -> time.monotonic(), for LatencyTracer
+        self.source = None  # Index of the input file in batch runs
+        self.deadline = None  # time.monotonic() by which it must be transcribed
+        self.cancelled = None  # "cancelled" or "timeout" once abandoned
+        self.sock = None  # Socket of the request in flight, for cancel()
+        self.sock_lock = threading.Lock()
+        # (utterance, first, last) chunk indices when cut from a longer
+        # utterance, and how many leading bytes repeat the previous chunk
+        self.chunk = None
+        self.overlap = 0
+
+    def mark(self, name, when=None):
+        self.marks[name] = time.monotonic() if when is None else when
+
+    @property
+    def duration(self):
+        return len(self.pcm) / float(self.sample_rate * self.sample_width)
+
+    def cancel(self, reason="cancelled"):
+        """Abandon the segment, aborting its request if one is in flight.
+
+        Returns False if it was already abandoned.
+        """
+        with self.sock_lock:
+            if self.cancelled:
+                return False
+            self.cancelled = reason
+            sock = self.sock
+        if sock is not None:
+            # Wakes the worker blocked on this socket right away
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        return True
+
+    def attach(self, sock):
+        """Called by InferenceClient before sending; raises if already abandoned"""
+        with self.sock_lock:
+            if self.cancelled:
+                raise SegmentCancelled(self.cancelled)
+            self.sock = sock
+
+    def detach(self):
+        with self.sock_lock:
+            self.sock = None
+
+    def filename_for(self, fmt):
+        extension = WIRE_FORMATS[fmt][0]
+        return f"segment.{extension}" if self.seq is None else f"segment_{self.seq}.{extension}"
+
+    def wav_parts(self):
+        """WAV file as [header, pcm view] so uploads never copy the samples"""
+        header = wav_header(len(self.pcm), self.sample_rate, self.sample_width)
+        return [header, memoryview(self.pcm)]
+
+    def encode(self, fmt=None):
+        """Return (file_parts, filename, content_type) in fmt (default WIRE_FORMAT)"""
+        fmt = fmt or WIRE_FORMAT
+        if fmt == "wav":
+            parts = self.wav_parts()
+        else:
+            parts = [sox_encode(self.pcm, fmt, self.sample_rate, self.sample_width)]
+        return parts, self.filename_for(fmt), WIRE_FORMATS[fmt][1]
+
+
+# Format -> (extension, content type, sox output options)
+WIRE_FORMATS = {
+    "wav": ("wav", "audio/wav", None),
+    "flac": ("flac", "audio/flac", ["-t", "flac", "-C", "0"]),
+    "mp3": ("mp3", "audio/mpeg", ["-t", "mp3", "-C", "64"]),
+}
+
+
+def sox_encode(pcm, fmt, sample_rate=SAMPLE_RATE, sample_width=SAMPLE_WIDTH):
+    """Encode raw mono PCM with sox; raises OSError if sox is missing or fails"""
+    cmd = [
+        "sox", "-t", "raw", "-r", str(sample_rate), "-e", "signed-integer",
+        "-b", str(sample_width * 8), "-c", "1", "-",
+    ] + WIRE_FORMATS[fmt][2] + ["-"]
+    try:
+        result = subprocess.run(cmd, input=pcm, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except FileNotFoundError:
+        raise OSError(f"sox is needed to upload {fmt} but is not installed")
+    if result.returncode != 0:
+        raise OSError(f"sox could not encode {fmt}: {result.stderr.decode(errors='replace').strip()}")
+    return result.stdout
+
+
+def load_audio(path):
+    """Read an audio file as capture-format PCM (16-bit mono at SAMPLE_RATE).
+
+    WAV is read in-process (converted with audioop if needed); anything
+    else is decoded with sox.
+    """
+    try:
+        with wave.open(path, "rb") as w:
+            channels, width, rate = w.getnchannels(), w.getsampwidth(), w.getframerate()
+            pcm = w.readframes(w.getnframes())
+    except (wave.Error, EOFError):
+        pcm = None
+    if pcm is None:
+        cmd = [
+            "sox", path, "-t", "raw", "-r", str(SAMPLE_RATE), "-e", "signed-integer",
+            "-b", str(SAMPLE_WIDTH * 8), "-c", "1", "-",
+        ]
+        try:
+            result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        except FileNotFoundError:
+            raise OSError(f"{path}: not a WAV file, and sox is not installed to decode it")
+        if result.returncode != 0:
+            raise OSError(f"{path}: {result.stderr.decode(errors='replace').strip()}")
+        return result.stdout
+    if (channels, width, rate) == (1, SAMPLE_WIDTH, SAMPLE_RATE):
+        return pcm
+    if audioop is None:
+        raise OSError(
+            f"{path}: {rate} Hz/{channels} ch/{width * 8} bit needs audioop to convert; "
+            f"re-encode it as {SAMPLE_RATE} Hz mono 16-bit"
+        )
+    if width != SAMPLE_WIDTH:
+        pcm = audioop.lin2lin(pcm, width, SAMPLE_WIDTH)
+    if channels == 2:
+        pcm = audioop.tomono(pcm, SAMPLE_WIDTH, 0.5, 0.5)
+    elif channels > 2:
+        raise OSError(f"{path}: {channels} channels are not supported")
+    if rate != SAMPLE_RATE:
+        pcm, _ = audioop.ratecv(pcm, SAMPLE_WIDTH, 1, rate, SAMPLE_RATE, None)
+    return pcm
+
+
+def wav_header(data_len, sample_rate=SAMPLE_RATE, sample_width=SAMPLE_WIDTH, channels=1):
+    """Canonical 44-byte RIFF/WAVE header for PCM data of the given size"""
+    block_align = channels * sample_width
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF", 36 + data_len, b"WAVE",
+        b"fmt ", 16, 1, channels, sample_rate, sample_rate * block_align,
+        block_align, sample_width * 8,
+        b"data", data_len,
+    )
+
+
+class SegmentCancelled(Exception):
+    """The segment was discarded or ran past its deadline"""
+
+    def __init__(self, reason):
+        super().__init__(f"segment {reason}")
+        self.reason = reason
+
+
+class ServerError(Exception):
+    """whisper-server answered, but with an error status or an unreadable body"""
+
+
+class InferenceClient:
+    """Keep-alive HTTP client for whisper-server's /inference endpoint.
+
+    The connection is reused between requests and reopened once if the
+    server dropped it. The multipart body is sent part by part, so the
+    audio buffer is never concatenated into a single payload.
+    """
+
+    BOUNDARY = "----WebKitFormBoundary7MA4YWxkTrZu0gW"
+
+    def __init__(self, host, port, connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT):
+        if http is None:
+            import_http()
+        self.host = host
+        self.port = port
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.conn = None
+
+    def connect(self):
+        self.conn = http.client.HTTPConnection(
+            self.host, self.port, timeout=self.connect_timeout
+        )
+        self.conn.connect()
+        # The connect timeout is short; inference itself may take a while
+        self.conn.sock.settimeout(self.read_timeout)
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def multipart(self, file_parts, filename, content_type, fields):
+        """Build the multipart body as a list of buffers plus its total length"""
+        boundary = self.BOUNDARY
+        head = b""
+        for name, value in fields.items():
+            head += (
+                f"--{boundary}\r\n"
+                f'Content-Disposition: form-data; name="{name}"\r\n\r\n'
+                f"{value}\r\n"
+            ).encode()
+        head += (
+            f"--{boundary}\r\n"
+            f'Content-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+            f"Content-Type: {content_type}\r\n\r\n"
+        ).encode()
+        tail = f"\r\n--{boundary}--\r\n".encode()
+        parts = [head] + list(file_parts) + [tail]
+        return parts, sum(len(part) for part in parts)
+
+    def infer(self, file_parts, filename, content_type="audio/wav", fields=None, marks=None,
+              token=None):
+        """POST the file and return the decoded JSON response.
+
+        If `marks` is given, "uploaded" and "response" times are stored in it.
+        `token` (an AudioSegment) can abort the request from another thread,
+        which raises SegmentCancelled here. Error replies raise ServerError.
+        """
+        if fields is None:
+            fields = {"temperature": "0.0", "response-format": "json"}
+        parts, length = self.multipart(file_parts, filename, content_type, fields)
+
+        for attempt in range(2):
+            reused = self.conn is not None
+            try:
+                if not reused:
+                    self.connect()
+                if token is not None:
+                    token.attach(self.conn.sock)
+                self.conn.putrequest("POST", "/inference", skip_accept_encoding=True)
+                self.conn.putheader(
+                    "Content-Type", f"multipart/form-data; boundary={self.BOUNDARY}"
+                )
+                self.conn.putheader("Content-Length", str(length))
+                self.conn.endheaders()
+                for part in parts:
+                    self.conn.send(part)
+                if marks is not None:
+                    marks["uploaded"] = time.monotonic()
+                response = self.conn.getresponse()
+                data = response.read()
+                if marks is not None:
+                    marks["response"] = time.monotonic()
+                if response.will_close:
+                    self.close()
+                try:
+                    result = json.loads(data.decode("utf-8"))
+                except ValueError:
+                    result = None
+                if not 200 <= response.status < 300:
+                    error = result.get("error") if isinstance(result, dict) else None
+                    raise ServerError(
+                        f"HTTP {response.status} {response.reason}"
+                        + (f": {error}" if error else "")
+                    )
+                if not isinstance(result, dict):
+                    raise ServerError("reply is not a JSON object")
+                return result
+            except (SegmentCancelled, ServerError):
+                raise
+            except socket.timeout:
+                self.close()
+                raise
+            except (http.client.HTTPException, ConnectionError, OSError):
+                self.close()
+                if token is not None and token.cancelled:
+                    raise SegmentCancelled(token.cancelled)
+                # A kept-alive connection may have been dropped by the server
+                # while idle; retry once on a fresh one
+                if not reused or attempt:
+                    raise
+            finally:
+                if token is not None:
+                    token.detach()
+
+
+class ServerInstance:
+    """Bookkeeping for one whisper-server in the pool"""
+
+    def __init__(self, port, threads=None, cpus=None, model_path=None):
+        self.port = port
+        self.threads = threads
+        self.cpus = cpus
+        self.model_path = model_path  # Overrides the supervisor's model
+        self.settings = None  # Launch settings; None = calibrated ones for the model
+        self.share = None  # Cores this server gets when several share the machine
+        self.process = None  # ChildProcess if we launched it
+        # stopped / starting / up / restarting / idle / failed
+        self.state = "stopped"
+        self.stopping = None  # Why we signalled our server: "idle", "restart" or "exit"
+        self.ever_up = False
+        self.up_since = 0.0
+        self.last_used = time.monotonic()
+        self.restarts = 0
+        self.health_failures = 0
+        self.leased = False
+        self.outstanding = 0
+        self.healthy = False
+        self.failures = 0
+        self.retry_at = 0.0
+
+    def command(self, server_path, model_path):
+        model_path = self.model_path or model_path
+        cmd = [server_path, "-m", model_path, "--port", str(self.port)]
+        settings = load_server_settings(model_path) if self.settings is None else self.settings
+        threads = self.threads or settings.get("threads")
+        if not self.threads and threads and self.share:
+            # Calibrated with the whole machine to itself
+            threads = min(threads, max(1, self.share // (settings.get("processors") or 1)))
+        if threads:
+            cmd += ["-t", str(threads)]
+        if settings.get("processors"):
+            cmd += ["-p", str(settings["processors"])]
+        if settings.get("beam_size"):
+            cmd += ["-bs", str(settings["beam_size"])]
+        return cmd
+
+
+def load_server_settings(model_path):
+    """Calibrated launch settings for a model from SERVER_CONFIG_FILE, or {}"""
+    try:
+        with open(SERVER_CONFIG_FILE) as f:
+            models = json.load(f)["models"]
+        return dict(models.get(os.path.basename(model_path)) or {})
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+        print(f"[WARN] Ignoring {SERVER_CONFIG_FILE}: {str(e)}", file=sys.stderr)
+        return {}
+
+
+def save_server_settings(model_path, settings):
+    """Store a model's launch settings, keeping other models' entries"""
+    try:
+        with open(SERVER_CONFIG_FILE) as f:
+            config = json.load(f)
+        config["models"].items()
+    except (OSError, ValueError, KeyError, TypeError, AttributeError):
+        config = {"models": {}}
+    config["models"][os.path.basename(model_path)] = settings
+    os.makedirs(os.path.dirname(SERVER_CONFIG_FILE), exist_ok=True)
+    tmp = f"{SERVER_CONFIG_FILE}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(config, f, indent=2)
+        f.write("\n")
+    os.replace(tmp, SERVER_CONFIG_FILE)
+
+
+class ServerPool:
+    """Dispatches requests to the least busy healthy whisper-server.
+
+    Each thread keeps one keep-alive InferenceClient per instance. A
+    failed request takes its instance out of rotation for
+    SERVER_RETRY_SECONDS. When other pools run alongside, `slots` is the
+    number of servers splitting the cores and `slot` the first of them
+    that this pool's instances take.
+    """
+
+    def __init__(self, base_port, count=SERVER_INSTANCES, threads=SERVER_THREADS,
+                 pin_cpus=SERVER_CPU_AFFINITY, model_path=None, slot=0, slots=None):
+        ncpu = os.cpu_count() or 1
+        slots = slots or count
+        per_instance = threads or max(1, ncpu // slots)
+        self.instances = []
+        for i in range(count):
+            cpus = None
+            if pin_cpus:
+                cpus = {((slot + i) * per_instance + j) % ncpu for j in range(per_instance)}
+            self.instances.append(ServerInstance(base_port + i, threads, cpus, model_path))
+            if slots > 1:
+                self.instances[-1].share = max(1, ncpu // slots)
+        self.lock = threading.Lock()
+        self.clients = threading.local()
+
+    @property
+    def ports(self):
+        return [instance.port for instance in self.instances]
+
+    @property
+    def required(self):
+        """Instances of which at least one must be up to transcribe"""
+        return self.instances
+
+    def acquire(self):
+        now = time.time()
+        with self.lock:
+            candidates = [
+                inst for inst in self.instances if inst.healthy and inst.retry_at <= now
+            ]
+            if not candidates:
+                # Nothing known-good; try whichever is due for a retry first
+                candidates = [min(self.instances, key=lambda inst: inst.retry_at)]
+            instance = min(candidates, key=lambda inst: inst.outstanding)
+            instance.outstanding += 1
+            instance.last_used = time.monotonic()
+            return instance
+
+    def release(self, instance, ok):
+        with self.lock:
+            instance.outstanding -= 1
+            instance.last_used = time.monotonic()
+            if ok:
+                instance.healthy = True
+                instance.failures = 0
+                instance.retry_at = 0.0
+            else:
+                instance.failures += 1
+                instance.retry_at = time.time() + SERVER_RETRY_SECONDS
+
+    def client(self, instance):
+        clients = getattr(self.clients, "by_port", None)
+        if clients is None:
+            clients = self.clients.by_port = {}
+        if instance.port not in clients:
+            clients[instance.port] = InferenceClient("127.0.0.1", instance.port)
+        return clients[instance.port]
+
+    def infer(self, file_parts, filename, duration=None, **kwargs):
+        """POST to the least busy instance; `duration` only matters to ModelRouter"""
+        instance = self.acquire()
+        ok = False
+        try:
+            result = self.client(instance).infer(file_parts, filename, **kwargs)
+            ok = True
+            return result
+        except SegmentCancelled as e:
+            # A missed deadline may mean a stuck server; a discard does not
+            ok = e.reason != "timeout"
+            raise
+        finally:
+            self.release(instance, ok)
+
+    def status(self):
+        with self.lock:
+            return " ".join(
+                f"{inst.port}:{'up' if inst.healthy else 'down'}/{inst.outstanding}"
+                for inst in self.instances
+            )
+
+
+class ModelRouter:
+    """Routes segments by length between a small and a large model's pools.
+
+    Segments up to max_seconds go to the small pool, and everything else
+    (or everything, while the small pool is down) goes to the large one.
+    Small-model results that are empty, fail, or fall under
+    fallback_logprob are re-run on the large model. It quacks like a
+    ServerPool, so the supervisor and the GUI use it unchanged.
+    """
+
+    ROUTES = ("small", "large", "fallback")
+
+    def __init__(self, large, small, max_seconds=ROUTE_MAX_SECONDS,
+                 fallback_logprob=ROUTE_FALLBACK_LOGPROB):
+        self.large = large
+        self.small = small
+        self.max_seconds = max_seconds
+        self.fallback_logprob = fallback_logprob
+        self.lock = threading.Lock()
+        # Per-route request latencies; "fallback" is the whole small+large round trip
+        self.latencies = {route: collections.deque(maxlen=TRACE_RING_SIZE) for route in self.ROUTES}
+        self.counts = collections.Counter()
+        self.fallbacks = collections.Counter()
+
+    @property
+    def instances(self):
+        return self.small.instances + self.large.instances
+
+    @property
+    def ports(self):
+        return self.small.ports + self.large.ports
+
+    @property
+    def required(self):
+        # The small model is only a shortcut
+        return self.large.instances
+
+    def record(self, route, start):
+        with self.lock:
+            self.counts[route] += 1
+            self.latencies[route].append(time.monotonic() - start)
+
+    def confidence(self, response):
+        """Mean avg_logprob over verbose_json segments, or None if not reported"""
+        values = [
+            seg["avg_logprob"] for seg in response.get("segments", ())
+            if isinstance(seg, dict) and "avg_logprob" in seg
+        ]
+        return sum(values) / len(values) if values else None
+
+    def fallback_reason(self, response):
+        if not clean_transcript(response.get("text", "")):
+            return "empty"
+        confidence = self.confidence(response)
+        if (self.fallback_logprob is not None and confidence is not None
+                and confidence < self.fallback_logprob):
+            return "low confidence"
+        return None
+
+    def infer(self, file_parts, filename, duration=None, fields=None, **kwargs):
+        small_up = any(instance.healthy for instance in self.small.instances)
+        if duration is None or duration > self.max_seconds or not small_up:
+            start = time.monotonic()
+            response = self.large.infer(file_parts, filename, fields=fields, **kwargs)
+            self.record("large", start)
+            return response
+
+        start = time.monotonic()
+        # verbose_json carries the per-segment avg_logprob used for fallback
+        small_fields = dict(fields or {"temperature": "0.0"})
+        small_fields["response_format"] = "verbose_json"
+        try:
+            response = self.small.infer(file_parts, filename, fields=small_fields, **kwargs)
+            reason = self.fallback_reason(response)
+        except (http.client.HTTPException, OSError, ServerError):
+            reason = "error"
+        self.record("small", start)
+        if reason is None:
+            return response
+
+        with self.lock:
+            self.fallbacks[reason] += 1
+        response = self.large.infer(file_parts, filename, fields=fields, **kwargs)
+        self.record("fallback", start)
+        return response
+
+    def summary(self):
+        with self.lock:
+            latencies = {route: list(values) for route, values in self.latencies.items()}
+            counts = dict(self.counts)
+            fallbacks = dict(self.fallbacks)
+        lines = [f"{'route':<10}{'count':>7}{'p50':>8}{'p95':>8}"]
+        for route in self.ROUTES:
+            values = latencies[route]
+            if not values:
+                continue
+            p50 = LatencyTracer.percentile(values, 50) * 1000
+            p95 = LatencyTracer.percentile(values, 95) * 1000
+            lines.append(f"{route:<10}{counts[route]:>7}{p50:>8.0f}{p95:>8.0f}")
+        small = counts.get("small", 0)
+        if small:
+            detail = ", ".join(f"{count} {reason}" for reason, count in sorted(fallbacks.items()))
+            rate = sum(fallbacks.values()) / float(small)
+            lines.append(f"fallback {rate:.0%} of small" + (f" ({detail})" if detail else ""))
+        return "\n".join(lines)
+
+    def status(self):
+        return f"small {self.small.status()} | large {self.large.status()}"
+
+
+def clean_transcript(text):
+    """Normalize a server transcript; returns "" for known hallucinations"""
+    text = text.strip().replace("\n", " ")
+    # Remove text enclosed in double asterisks (sound dictation)
+    text = re.sub(r"\*.*?\*", "", text)
+    if len(text) > 15 or "hank you" not in text:
+        return text
+    return ""
+
+
+def _norm_word(word):
+    return re.sub(r"[^\w']", "", word.lower())
+
+
+def common_prefix_len(a, b, key=lambda x: x):
+    n = 0
+    for x, y in zip(a, b):
+        if key(x) != key(y):
+            break
+        n += 1
+    return n
+
+
+def strip_committed_overlap(committed, words, max_overlap=30):
+    """Drop the head of `words` that repeats the tail of `committed`.
+
+    Returns None when no overlap is found, so callers can tell "nothing
+    repeated" apart from "could not align".
+    """
+    limit = min(len(committed), len(words), max_overlap)
+    for k in range(limit, 0, -1):
+        if [_norm_word(w) for w in committed[-k:]] == [_norm_word(w) for w in words[:k]]:
+            return words[k:]
+    return None
+
+
+def align_committed_tail(committed, words, min_match=2):
+    """Drop everything in `words` up to the committed words it repeats.
+
+    `words` is a hypothesis for a window that starts somewhere inside the
+    committed text, so it opens with a suffix of `committed` (possibly
+    after a clipped first word). The longest such suffix is located
+    anywhere in `words`; its length is only bounded by `words`. Returns
+    the words after it, or None when fewer than `min_match` words (or
+    all of a shorter `committed`) line up.
+    """
+    ref = [_norm_word(w) for w in committed]
+    hyp = [_norm_word(w) for w in words]
+    best, best_end = 0, None
+    for end in range(1, len(hyp) + 1):
+        # Committed suffix that ends exactly at hyp[end - 1]
+        n = 0
+        while n < min(len(ref), end) and ref[-1 - n] == hyp[end - 1 - n]:
+            n += 1
+        if n > best:
+            best, best_end = n, end
+    if best_end is None or best < min(min_match, len(ref)):
+        return None
+    return words[best_end:]
+
+
+def frame_rms(frame):
+    """RMS of a 16-bit PCM frame"""
+    if audioop is not None:
+        return audioop.rms(frame, SAMPLE_WIDTH)
+    samples = array.array("h", frame)
+    if not samples:
+        return 0
+    return int((sum(map(operator.mul, samples, samples)) / len(samples)) ** 0.5)
+
+
+def frame_zcr(frame):
+    """Zero-crossing rate of a 16-bit PCM frame (crossings per sample)"""
+    count = len(frame) // SAMPLE_WIDTH
+    if not count:
+        return 0.0
+    if audioop is not None:
+        return audioop.cross(frame, SAMPLE_WIDTH) / count
+    samples = array.array("h", frame)
+    signs = [x >= 0 for x in samples]
+    return sum(a != b for a, b in zip(signs, signs[1:])) / count
+
+
+class VoiceActivityDetector:
+    """Energy/zero-crossing VAD with hangover over the live PCM stream.
+
+    It only tracks absolute ring positions and reports ("start", pos) and
+    ("end", pos) events; the start is moved back by the pre-roll and the
+    caller cuts the audio out of the ring. threshold and end_silence_ms are
+    read on every frame, so they can be changed while capture is running.
+    """
+
+    def __init__(self, threshold=THRESH_START, end_silence_ms=END_SILENCE_MS,
+                 start_ms=VAD_START_MS, preroll_ms=PREROLL_MS, frame_ms=VAD_FRAME_MS):
+        self.threshold = threshold
+        self.end_silence_ms = end_silence_ms
+        self.start_ms = start_ms
+        self.preroll_ms = preroll_ms
+        self.frame_ms = frame_ms
+        self.frame_bytes = int(SAMPLE_RATE * frame_ms / 1000) * SAMPLE_WIDTH
+        self.reset(0)
+
+    def reset(self, position):
+        self.pending = bytearray()
+        self.position = position  # Stream position of the first pending byte
+        self.floor = position  # Never reach back before this
+        self.in_speech = False
+        self.speech_run = 0
+        self.silence_run = 0
+
+    def ms_to_bytes(self, ms):
+        return int(SAMPLE_RATE * ms / 1000) * SAMPLE_WIDTH
+
+    def is_speech(self, frame):
+        level = 100.0 * frame_rms(frame) / 32768
+        if level < self.threshold:
+            return False
+        return level >= 2 * self.threshold or frame_zcr(frame) < VAD_MAX_ZCR
+
+    def feed(self, data):
+        """Consume PCM that was just appended to the ring; returns events"""
+        events = []
+        self.pending += data
+        offset = 0
+        while len(self.pending) - offset >= self.frame_bytes:
+            frame = bytes(self.pending[offset:offset + self.frame_bytes])
+            offset += self.frame_bytes
+            frame_end = self.position + offset
+            speech = self.is_speech(frame)
+
+            if not self.in_speech:
+                self.speech_run = self.speech_run + self.frame_ms if speech else 0
+                if self.speech_run >= self.start_ms:
+                    self.in_speech = True
+                    self.silence_run = 0
+                    start = frame_end - self.ms_to_bytes(self.speech_run + self.preroll_ms)
+                    events.append(("start", max(start, self.floor)))
+            else:
+                self.silence_run = 0 if speech else self.silence_run + self.frame_ms
+                if self.silence_run >= self.end_silence_ms:
+                    self.in_speech = False
+                    self.speech_run = 0
+                    trim = max(0, self.silence_run - VAD_TRAIL_MS)
+                    events.append(("end", frame_end - self.ms_to_bytes(trim)))
+        del self.pending[:offset]
+        self.position += offset
+        return events
+
+    def flush(self):
+        """End an utterance that is still open when capture stops"""
+        end = self.position + len(self.pending)
+        self.pending = bytearray()
+        self.position = end
+        if self.in_speech:
+            self.in_speech = False
+            self.speech_run = 0
+            return [("end", end)]
+        return []
+
+
+class UtteranceChunker:
+    """Cuts long utterances into overlapping chunks while they are spoken.
+
+    Feed it the VAD's start/end positions. Once the open utterance reaches
+    max_seconds, poll() cuts it at the quietest frame in the last
+    search_seconds. The chunk runs to half the overlap past the cut, and
+    the utterance continues from half the overlap before it. end() returns
+    the remainder. Every piece comes back as (segment, start, end) ring
+    positions, with AudioSegment.chunk set when the utterance was split.
+    """
+
+    def __init__(self, ring, max_seconds=CHUNK_MAX_SECONDS, search_seconds=CHUNK_SEARCH_SECONDS,
+                 overlap_seconds=CHUNK_OVERLAP_SECONDS, frame_ms=VAD_FRAME_MS):
+        self.ring = ring
+        self.max_bytes = int(max_seconds * SAMPLE_RATE) * SAMPLE_WIDTH
+        self.search_bytes = min(int(search_seconds * SAMPLE_RATE) * SAMPLE_WIDTH, self.max_bytes // 2)
+        self.half_overlap = int(overlap_seconds * SAMPLE_RATE / 2) * SAMPLE_WIDTH
+        self.frame_bytes = int(SAMPLE_RATE * frame_ms / 1000) * SAMPLE_WIDTH
+        self.start = None
+        self.index = 0
+
+    def begin(self, pos):
+        self.start = pos
+        self.utterance = pos  # Unique per utterance: nothing else starts there
+        self.index = 0
+
+    def quietest(self, start, end):
+        """Ring position in the middle of the lowest-energy frame in [start, end)"""
+        pcm = self.ring.read(start, end)
+        best, best_rms = len(pcm) // 2, None
+        for offset in range(0, len(pcm) - self.frame_bytes + 1, self.frame_bytes):
+            rms = frame_rms(pcm[offset:offset + self.frame_bytes])
+            if best_rms is None or rms < best_rms:
+                best, best_rms = offset + self.frame_bytes // 2, rms
+        best -= best % SAMPLE_WIDTH
+        return start + best
+
+    def piece(self, start, end):
+        segment = AudioSegment(self.ring.read(start, end))
+        if self.index:
+            segment.overlap = 2 * self.half_overlap
+        return segment
+
+    def poll(self):
+        """Cut a chunk off the open utterance if it is long enough, else None"""
+        if self.start is None or self.ring.position - self.start < self.max_bytes:
+            return None
+        end = self.ring.position
+        cut = self.quietest(end - self.search_bytes, end - self.half_overlap)
+        start = self.start
+        segment = self.piece(start, cut + self.half_overlap)
+        segment.chunk = (self.utterance, self.index, self.index)
+        self.start = cut - self.half_overlap
+        self.index += 1
+        return segment, start, cut + self.half_overlap
+
+    def end(self, pos):
+        """Close the utterance; returns its last piece, or None if it is empty"""
+        start, self.start = self.start, None
+        if start is None or pos <= start:
+            return None
+        segment = self.piece(start, pos)
+        if self.index:
+            segment.chunk = (self.utterance, self.index, self.index)
+        return segment, start, pos
+
+
+def split_pcm(pcm, block=4096):
+    """Cut a whole recording into overlapping chunks, as UtteranceChunker does live.
+
+    A generator: each chunk is only copied out when the caller asks for it.
+    """
+    ring = PCMRingBuffer(2 * int(CHUNK_MAX_SECONDS * SAMPLE_RATE) * SAMPLE_WIDTH + block)
+    chunker = UtteranceChunker(ring)
+    chunker.begin(0)
+    view = memoryview(pcm)
+    for offset in range(0, len(pcm), block):
+        ring.write(view[offset:offset + block])
+        piece = chunker.poll()
+        if piece:
+            yield piece[0]
+    piece = chunker.end(ring.position)
+    if piece:
+        yield piece[0]
+
+
+class TextTyper:
+    """Types text into the focused window on its own worker thread.
+
+    Jobs are executed in order, so corrections (backspaces) always land
+    after the text they fix. The strategy is picked per job from the
+    length of the text and the class of the focused window.
+    """
+
+    def __init__(self, on_status=print):
+        self.on_status = on_status
+        self.jobs = queue.Queue()
+        self.xdotool = shutil.which("xdotool")
+        self.clipboard_tool = shutil.which("xclip") or shutil.which("xsel")
+        self.controller = None
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def type(self, text, on_done=None):
+        """Queue text; on_done() runs on the worker once it has been typed"""
+        if text:
+            self.jobs.put(("type", text, on_done))
+
+    def erase(self, count):
+        if count > 0:
+            self.jobs.put(("erase", count, None))
+
+    def discard(self):
+        """Drop queued jobs that have not started yet; returns how many"""
+        count = 0
+        while True:
+            try:
+                self.jobs.get_nowait()
+            except queue.Empty:
+                return count
+            count += 1
+
+    def run(self):
+        while True:
+            kind, arg, on_done = self.jobs.get()
+            try:
+                if kind == "type":
+                    self.type_now(arg)
+                else:
+                    self.erase_now(arg)
+            except Exception as e:
+                self.on_status(f"[ERROR] Typing failed: {str(e)}\n")
+            if on_done is not None:
+                on_done()
+
+    def keyboard(self):
+        # pynput is only needed by the pynput and paste fallbacks
+        if self.controller is None:
+            import pynput
+            self.controller = pynput.keyboard.Controller()
+        return self.controller
+
+    def active_window_class(self):
+        if not self.xdotool:
+            return ""
+        try:
+            out = subprocess.run(
+                [self.xdotool, "getactivewindow", "getwindowclassname"],
+                capture_output=True, text=True, timeout=0.5,
+            )
+            return out.stdout.strip().lower()
+        except (OSError, subprocess.SubprocessError):
+            return ""
+
+    def choose_strategy(self, text):
+        strategy = TYPING_STRATEGY
+        if TYPING_APP_STRATEGY:
+            strategy = TYPING_APP_STRATEGY.get(self.active_window_class(), strategy)
+        if strategy == "auto":
+            if len(text) >= PASTE_MIN_CHARS and self.clipboard_tool:
+                strategy = "clipboard"
+            else:
+                strategy = "xdotool" if self.xdotool else "pynput"
+        if strategy == "xdotool" and not self.xdotool:
+            strategy = "pynput"
+        if strategy == "clipboard" and not self.clipboard_tool:
+            strategy = "pynput"
+        return strategy
+
+    def type_now(self, text):
+        strategy = self.choose_strategy(text)
+        start = time.time()
+        if strategy == "clipboard":
+            self.paste(text)
+        elif strategy == "xdotool":
+            subprocess.run(
+                [self.xdotool, "type", "--delay", str(XDOTOOL_DELAY_MS), "--", text],
+                check=True,
+            )
+        else:
+            self.keyboard().type(text)
+        elapsed = time.time() - start
+        rate = len(text) / elapsed if elapsed > 0 else 0.0
+        self.on_status(
+            f"[INFO] Typed {len(text)} chars via {strategy} in {elapsed:.2f}s ({rate:.0f} chars/s)\n"
+        )
+
+    def erase_now(self, count):
+        if self.xdotool and TYPING_STRATEGY != "pynput":
+            subprocess.run(
+                [self.xdotool, "key", "--delay", str(XDOTOOL_DELAY_MS),
+                 "--repeat", str(count), "BackSpace"],
+                check=True,
+            )
+            return
+        keyboard = self.keyboard()
+        import pynput
+        for _ in range(count):
+            keyboard.tap(pynput.keyboard.Key.backspace)
+
+    def clipboard_command(self, selection, read=False):
+        if os.path.basename(self.clipboard_tool) == "xclip":
+            return [self.clipboard_tool, "-selection", selection] + (["-o"] if read else [])
+        return [self.clipboard_tool, f"--{selection}", "--output" if read else "--input"]
+
+    def paste(self, text):
+        """Paste through the X selections and restore the clipboard afterwards"""
+        try:
+            saved = subprocess.run(
+                self.clipboard_command("clipboard", read=True),
+                capture_output=True, timeout=0.5,
+            ).stdout
+        except (OSError, subprocess.SubprocessError):
+            saved = None
+        # Shift+Insert pastes CLIPBOARD in GTK/Qt apps and PRIMARY in
+        # terminals, so set both
+        for selection in ("clipboard", "primary"):
+            subprocess.run(self.clipboard_command(selection), input=text.encode(), check=True)
+        if self.xdotool:
+            subprocess.run([self.xdotool, "key", "--clearmodifiers", "shift+Insert"], check=True)
+        else:
+            import pynput
+            Key = pynput.keyboard.Key
+            with self.keyboard().pressed(Key.shift):
+                self.keyboard().tap(Key.insert)
+        if saved:
+            # Give the target app a moment to request the selection first
+            time.sleep(0.1)
+            subprocess.run(self.clipboard_command("clipboard"), input=saved)
+
+
+class SegmentGate:
+    """Drops silent and noise-only segments before they are sent for inference"""
+
+    def __init__(self, vad, min_seconds=GATE_MIN_SECONDS, min_rms=GATE_MIN_RMS,
+                 min_speech_ratio=GATE_MIN_SPEECH_RATIO):
+        self.vad = vad  # Shares the live threshold and frame size
+        self.min_seconds = min_seconds
+        self.min_rms = min_rms
+        self.min_speech_ratio = min_speech_ratio
+        self.passed = 0
+        self.dropped = collections.Counter()
+
+    def speech_ratio(self, pcm):
+        size = self.vad.frame_bytes
+        frames = len(pcm) // size
+        if not frames:
+            return 0.0
+        view = memoryview(pcm)
+        limit = self.vad.threshold * 32768 / 100.0
+        # One C-level RMS per frame instead of a Python loop per sample
+        speech = sum(
+            frame_rms(view[i:i + size]) >= limit for i in range(0, frames * size, size)
+        )
+        return speech / frames
+
+    def check(self, segment):
+        """Return why the segment should be dropped, or None to keep it"""
+        reason = None
+        level = 100.0 * frame_rms(segment.pcm) / 32768
+        if segment.duration < self.min_seconds:
+            reason = f"too short: {segment.duration:.2f}s"
+        elif level < self.min_rms:
+            reason = f"too quiet: {level:.2f}%"
+        else:
+            ratio = self.speech_ratio(segment.pcm)
+            if ratio < self.min_speech_ratio:
+                reason = f"little speech: {ratio:.0%} of frames"
+        if reason is None:
+            self.passed += 1
+        else:
+            self.dropped[reason.split(":")[0]] += 1
+        return reason
+
+    def summary(self):
+        total = sum(self.dropped.values())
+        details = ", ".join(f"{count} {why}" for why, count in self.dropped.items())
+        return f"{total} dropped ({details}), {self.passed} passed" if total else f"{self.passed} passed"
+
+
+class TranscriptionPipeline:
+    """Capture -> inference workers -> ordered commit.
+
+    submit() never blocks, so capture never waits on inference: when too
+    many segments are waiting, the overflow policy merges or drops them.
+    Up to `workers` segments are transcribed at once, and results are
+    handed to on_text strictly in sequence order. A segment still queued
+    or in flight `deadline` seconds after submission is abandoned, and
+    cancel_all() abandons everything not yet committed; in-flight
+    requests are aborted at the socket. The deadline clock stops between
+    pause_deadlines() and resume_deadlines(), while no server is up.
+    """
+
+    def __init__(self, transcribe, on_text, on_status=print,
+                 workers=INFERENCE_WORKERS, max_pending=MAX_PENDING_SEGMENTS,
+                 overflow=OVERFLOW_POLICY, gate=None, deadline=SEGMENT_DEADLINE_SECONDS):
+        self.transcribe = transcribe  # segment -> text, may raise
+        self.on_text = on_text  # (segment, text), called in order
+        self.on_status = on_status
+        self.gate = gate  # Optional SegmentGate
+        self.max_pending = max_pending
+        self.overflow = overflow
+        self.deadline = deadline
+        self.paused_at = None  # Deadlines are on hold since then
+        self.pending = collections.deque()
+        self.inflight = set()
+        self.lock = threading.RLock()
+        self.cond = threading.Condition(self.lock)
+        self.expiry = threading.Condition(self.lock)  # Wakes the deadline watchdog
+        self.seq = itertools.count()
+        self.results = {}
+        self.next_commit = 0
+        self.submitted = 0
+        self.merged = 0
+        self.dropped = 0
+        self.cancelled = 0
+        self.timed_out = 0
+        self.carry = None  # (utterance, last chunk, words) of the last committed chunk
+        self.spoken = None  # Utterance whose text was handed to on_text last
+        for _ in range(workers):
+            threading.Thread(target=self.worker, daemon=True).start()
+        if deadline is not None:
+            threading.Thread(target=self.watchdog, daemon=True).start()
+
+    def submit(self, segment):
+        if self.gate is not None:
+            reason = self.gate.check(segment)
+            if reason:
+                self.on_status(f"[INFO] Skipped segment ({reason}); gate: {self.gate.summary()}\n")
+                return
+        with self.cond:
+            if len(self.pending) >= self.max_pending:
+                if self.overflow == "merge":
+                    last = self.pending[-1]
+                    self.merge(last, segment)
+                    self.merged += 1
+                    self.on_status(f"[WARN] Inference backlog, merged segment into #{last.seq}\n")
+                    return
+                if self.overflow == "drop-newest":
+                    self.dropped += 1
+                    self.on_status("[WARN] Inference backlog, dropped newest segment\n")
+                    return
+                oldest = self.pending.popleft()
+                self.skip(oldest.seq)
+                self.dropped += 1
+                self.on_status(f"[WARN] Inference backlog, dropped segment #{oldest.seq}\n")
+            segment.seq = next(self.seq)
+            self.submitted += 1
+            segment.mark("submitted")
+            if self.deadline is not None:
+                # While paused the clock starts when the pause ends
+                segment.deadline = (self.paused_at or time.monotonic()) + self.deadline
+            self.pending.append(segment)
+            self.cond.notify()
+            self.expiry.notify()
+
+    @staticmethod
+    def merge(last, segment):
+        """Append segment's audio to the still-queued segment before it"""
+        if (segment.chunk is not None and last.chunk is not None
+                and segment.chunk[0] == last.chunk[0] and segment.chunk[1] == last.chunk[2] + 1):
+            # Consecutive chunks: keep the shared audio only once
+            last.pcm = last.pcm + segment.pcm[segment.overlap:]
+            last.chunk = (last.chunk[0], last.chunk[1], segment.chunk[2])
+            return
+        last.pcm = last.pcm + segment.pcm
+        if segment.chunk is not None and not segment.overlap:
+            # First chunk of an utterance; later chunks stitch onto this one
+            last.chunk = segment.chunk
+
+    def worker(self):
+        while True:
+            with self.cond:
+                while not self.pending:
+                    self.cond.wait()
+                segment = self.pending.popleft()
+                self.inflight.add(segment)
+                self.cond.notify_all()
+            segment.mark("dequeued")
+            try:
+                text = self.transcribe(segment)
+            except SegmentCancelled:
+                text = None  # Already counted and reported by whoever cancelled it
+            except Exception as e:
+                if segment.cancelled:
+                    text = None  # The abort surfaced as a connection error
+                else:
+                    self.on_status(f"[ERROR] Error: {str(e)}\n")
+                    text = None
+            self.complete(segment, text)
+
+    def watchdog(self):
+        """Abandon segments that are still queued or in flight past their deadline"""
+        with self.lock:
+            while True:
+                now = time.monotonic()
+                if self.paused_at is not None:
+                    self.expiry.wait()
+                    continue
+                for segment in [seg for seg in self.pending if seg.deadline <= now]:
+                    self.pending.remove(segment)
+                    segment.cancel("timeout")
+                    self.timed_out += 1
+                    self.on_status(f"[WARN] Segment #{segment.seq} timed out in the queue\n")
+                    self.skip(segment.seq)
+                for segment in self.inflight:
+                    if segment.deadline <= now and segment.cancel("timeout"):
+                        self.timed_out += 1
+                        self.on_status(f"[WARN] Segment #{segment.seq} timed out after {self.deadline:g}s; request aborted\n")
+                deadlines = [
+                    seg.deadline for seg in itertools.chain(self.pending, self.inflight)
+                    if not seg.cancelled
+                ]
+                self.expiry.wait(max(0.0, min(deadlines) - now) if deadlines else None)
+
+    def pause_deadlines(self):
+        """Stop the deadline clock, e.g. while the server (re)starts"""
+        with self.lock:
+            if self.paused_at is None:
+                self.paused_at = time.monotonic()
+
+    def resume_deadlines(self):
+        """Restart the clock; deadlines move back by the time spent paused"""
+        with self.lock:
+            if self.paused_at is None:
+                return
+            paused = time.monotonic() - self.paused_at
+            self.paused_at = None
+            for segment in itertools.chain(self.pending, self.inflight):
+                if segment.deadline is not None:
+                    segment.deadline += paused
+            self.expiry.notify()
+
+    def cancel_all(self):
+        """Abandon everything not yet committed; returns how many segments"""
+        with self.lock:
+            count = 0
+            while self.pending:
+                segment = self.pending.popleft()
+                segment.cancel()
+                self.skip(segment.seq)
+                count += 1
+            for segment in self.inflight:
+                if segment.cancel():
+                    count += 1
+            # Finished but still waiting for an earlier segment to commit
+            for seq, (segment, text) in list(self.results.items()):
+                if segment is not None and segment.cancel():
+                    self.results[seq] = (segment, None)
+                    count += 1
+            self.cancelled += count
+            self.carry = None
+            return count
+
+    def skip(self, seq):
+        """Let the commit order move past a segment that will never finish"""
+        self.results[seq] = (None, None)
+        self.commit_ready()
+
+    def complete(self, segment, text):
+        with self.cond:
+            self.inflight.discard(segment)
+            if segment.cancelled:
+                text = None  # Never type text the user discarded
+            self.results[segment.seq] = (segment, text)
+            self.commit_ready()
+
+    def commit_ready(self):
+        # Called with self.cond held, which also keeps on_text calls ordered
+        progressed = False
+        while self.next_commit in self.results:
+            segment, text = self.results.pop(self.next_commit)
+            self.next_commit += 1
+            progressed = True
+            if segment is not None and segment.chunk is not None:
+                text = self.stitch(segment, text)
+            if text:
+                self.on_text(segment, text)
+        if progressed:
+            self.cond.notify_all()
+
+    def stitch(self, segment, text):
+        """Drop the words a chunk repeats from the end of the chunk before it.
+
+        A chunk continuing an utterance that already produced text gets a
+        leading space, so the words either side of the cut stay apart.
+        """
+        utterance, first, last = segment.chunk
+        words = text.split() if text else []
+        previous, self.carry = self.carry, (utterance, last, words)
+        if words and previous is not None and previous[:2] == (utterance, first - 1):
+            rest = strip_committed_overlap(previous[2], words)
+            if rest is not None:
+                text = " ".join(rest)
+        if not text:
+            return text
+        if first > 0 and self.spoken == utterance:
+            text = " " + text
+        self.spoken = utterance
+        return text
+
+    def summary(self):
+        return (
+            f"{self.submitted} segments, {self.merged} merged, {self.dropped} dropped, "
+            f"{self.cancelled} cancelled, {self.timed_out} timed out"
+        )
+
+    def wait_pending(self, limit):
+        """Block while `limit` or more segments are queued (offline producers)"""
+        with self.cond:
+            self.cond.wait_for(lambda: len(self.pending) < limit)
+
+    def wait_idle(self, timeout=None):
+        """Block until every submitted segment has been committed or skipped"""
+        with self.cond:
+            return self.cond.wait_for(lambda: self.next_commit >= self.submitted, timeout)
+
+
+class LatencyTracer:
+    """Per-segment stage latencies kept in a fixed-size ring.
+
+    Spans are derived from the marks an AudioSegment collects on its way
+    through capture, the pipeline, the server and the typer.
+    """
+
+    # (stage, from mark, to mark)
+    STAGES = (
+        ("capture", "speech_start", "speech_end"),
+        ("vad", "speech_end", "endpoint"),
+        ("queue", "submitted", "dequeued"),
+        ("encode", "dequeued", "encoded"),
+        ("upload", "encoded", "uploaded"),
+        ("inference", "uploaded", "response"),
+        ("postfilter", "response", "filtered"),
+        ("reorder", "filtered", "committed"),
+        ("typing", "committed", "typed"),
+        ("total", "speech_end", "typed"),
+    )
+
+    def __init__(self, size=TRACE_RING_SIZE, path=TRACE_FILE):
+        self.records = collections.deque(maxlen=size)
+        self.path = path
+        self.lock = threading.Lock()
+
+    def finish(self, segment):
+        """Record the spans of a segment that has gone all the way through"""
+        marks = segment.marks
+        spans = {
+            stage: marks[end] - marks[start]
+            for stage, start, end in self.STAGES
+            if start in marks and end in marks
+        }
+        record = {
+            "seq": segment.seq,
+            "time": segment.created,
+            "audio_seconds": round(segment.duration, 3),
+            "spans": {stage: round(value, 4) for stage, value in spans.items()},
+        }
+        with self.lock:
+            self.records.append(record)
+            if self.path:
+                try:
+                    with open(self.path, "a") as f:
+                        f.write(json.dumps(record) + "\n")
+                except OSError as e:
+                    print(f"Trace write failed: {e}")
+        return record
+
+    @staticmethod
+    def percentile(values, pct):
+        ordered = sorted(values)
+        index = max(0, int(round(pct / 100.0 * len(ordered))) - 1)
+        return ordered[min(index, len(ordered) - 1)]
+
+    def stats(self):
+        """{stage: (p50, p95, p99)} in seconds, plus the real-time factor"""
+        with self.lock:
+            records = list(self.records)
+        stats = {}
+        for stage, _, _ in self.STAGES:
+            values = [r["spans"][stage] for r in records if stage in r["spans"]]
+            if values:
+                stats[stage] = tuple(self.percentile(values, p) for p in (50, 95, 99))
+        audio = sum(r["audio_seconds"] for r in records if "inference" in r["spans"])
+        inference = sum(r["spans"]["inference"] for r in records if "inference" in r["spans"])
+        rtf = inference / audio if audio else None
+        return stats, rtf
+
+    def summary(self):
+        stats, rtf = self.stats()
+        if not stats:
+            return "No segments yet"
+        lines = [f"{'stage':<11}{'p50':>8}{'p95':>8}{'p99':>8}  (ms)"]
+        for stage, _, _ in self.STAGES:
+            if stage in stats:
+                p50, p95, p99 = (v * 1000 for v in stats[stage])
+                lines.append(f"{stage:<11}{p50:>8.0f}{p95:>8.0f}{p99:>8.0f}")
+        if rtf is not None:
+            lines.append(f"RTF {rtf:.3f} over {len(self.records)} segments")
+        return "\n".join(lines)
+
+
+class LevelMeter:
+    """Input level computed straight from captured PCM blocks"""
+
+    def __init__(self):
+        self.rms_db = METER_FLOOR_DB
+        self.peak_db = METER_FLOOR_DB
+        self.clipped = 0  # Clipped samples since capture started
+
+    @staticmethod
+    def to_db(value):
+        return max(METER_FLOOR_DB, 20 * math.log10(value / 32768.0)) if value > 0 else METER_FLOOR_DB
+
+    def feed(self, block):
+        """Measure one block; returns (rms dBFS, peak dBFS, clipped samples so far)"""
+        block = block[:len(block) - len(block) % SAMPLE_WIDTH]
+        if not block:
+            return self.rms_db, self.peak_db, self.clipped
+        if audioop is not None:
+            rms = audioop.rms(block, SAMPLE_WIDTH)
+            peak = audioop.max(block, SAMPLE_WIDTH)
+            if peak >= CLIP_LEVEL:
+                samples = array.array("h", block)
+                self.clipped += samples.count(32767) + samples.count(-32768)
+        else:
+            samples = array.array("h", block)
+            rms = frame_rms(block)
+            peak = max(max(samples), -min(samples))
+            if peak >= CLIP_LEVEL:
+                self.clipped += samples.count(32767) + samples.count(-32768)
+        self.rms_db = self.to_db(rms)
+        self.peak_db = self.to_db(peak)
+        return self.rms_db, self.peak_db, self.clipped
+
+
+class StreamingTranscriber:
+    """Incrementally transcribes the utterance that is still being recorded.
+
+    Every STREAM_INTERVAL_MS the most recent STREAM_WINDOW_SECONDS of the
+    live utterance are sent for inference. Words that two consecutive
+    hypotheses agree on are committed; the rest is shown as provisional.
+    """
+
+    def __init__(self, ring, transcribe, on_update, on_type, on_erase):
+        self.ring = ring
+        self.transcribe = transcribe  # pcm bytes -> text
+        self.on_update = on_update  # (committed delta, provisional tail, final)
+        self.on_type = on_type  # text to type
+        self.on_erase = on_erase  # number of characters to backspace
+        self.events = queue.Queue()
+        self.utterance_start = None
+        self.reset()
+
+    def reset(self):
+        self.committed = []  # Words committed for the current utterance
+        self.pending = []  # Uncommitted words of the previous hypothesis
+        self.screen = ""  # What has been typed for the current utterance
+
+    def begin(self, start_pos):
+        self.events.put(("begin", start_pos))
+
+    def end(self, end_pos):
+        self.events.put(("end", end_pos))
+
+    def run(self):
+        while True:
+            # Only wake on the interval while an utterance is open; between
+            # utterances block until the VAD reports the next one
+            timeout = None if self.utterance_start is None else STREAM_INTERVAL_MS / 1000.0
+            try:
+                kind, pos = self.events.get(timeout=timeout)
+            except queue.Empty:
+                if self.utterance_start is not None:
+                    self.tick(self.ring.position, final=False)
+                continue
+            if kind == "begin":
+                self.utterance_start = pos
+                self.reset()
+            elif kind == "end" and self.utterance_start is not None:
+                self.tick(pos, final=True)
+                self.utterance_start = None
+
+    def tick(self, end_pos, final):
+        window = STREAM_WINDOW_SECONDS * SAMPLE_RATE * SAMPLE_WIDTH
+        start_pos = max(self.utterance_start, end_pos - window)
+        pcm = self.ring.read(start_pos, end_pos)
+        if not pcm:
+            return
+        words = self.transcribe(pcm).split()
+
+        if start_pos == self.utterance_start:
+            # Window still covers the whole utterance, words line up by position
+            words = words[len(self.committed):]
+        else:
+            # Window has slid past the start; align on the committed tail
+            aligned = align_committed_tail(self.committed, words)
+            if aligned is None and not final:
+                return
+            # Typing the whole window would repeat what is already typed
+            words = [] if aligned is None else aligned
+
+        if final:
+            stable, tail = words, []
+        else:
+            stable = words[:common_prefix_len(self.pending, words, key=_norm_word)]
+            tail = words[len(stable):]
+        self.pending = tail
+
+        delta = " ".join(stable)
+        if delta and self.committed:
+            delta = " " + delta
+        self.committed.extend(stable)
+        provisional = " ".join(tail)
+        self.apply_to_screen(provisional)
+        self.on_update(delta, provisional, final)
+
+    def apply_to_screen(self, provisional):
+        """Bring the typed text in line with committed (+ provisional) words"""
+        target = " ".join(self.committed)
+        if STREAM_TYPE_PROVISIONAL and provisional:
+            target = f"{target} {provisional}" if target else provisional
+        keep = common_prefix_len(self.screen, target)
+        if keep < len(self.screen):
+            self.on_erase(len(self.screen) - keep)
+        if keep < len(target):
+            self.on_type(target[keep:])
+        self.screen = target
+
+
+class EventLoop:
+    """One selectors loop for child processes, pipes, sockets and timers.
+
+    Callbacks run on the loop thread. Nothing polls: with no I/O and no
+    timer due, the thread sleeps in select() until something happens.
+    watch(), call_later() and call_soon_threadsafe() are safe to call from
+    any thread.
+    """
+
+    def __init__(self):
+        self.selector = selectors.DefaultSelector()
+        self.timers = []  # Heap of [when, seq, callback, args, cancelled]
+        self.counter = itertools.count()
+        self.ready = collections.deque()
+        self.lock = threading.Lock()
+        self.thread = None
+        self.running = False
+        self.wake_r, self.wake_w = os.pipe()
+        os.set_blocking(self.wake_r, False)
+        os.set_blocking(self.wake_w, False)
+        self.selector.register(self.wake_r, selectors.EVENT_READ, self.drain_wakeups)
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.run, name="event-loop", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        self.wake()
+
+    def in_loop(self):
+        return threading.current_thread() is self.thread
+
+    def wake(self):
+        try:
+            os.write(self.wake_w, b"\0")
+        except (BlockingIOError, OSError):
+            pass  # Already pending, or shutting down
+
+    def drain_wakeups(self):
+        try:
+            while os.read(self.wake_r, 4096):
+                pass
+        except BlockingIOError:
+            pass
+
+    def call_soon_threadsafe(self, callback, *args):
+        self.ready.append((callback, args))
+        if not self.in_loop():
+            self.wake()
+
+    def call_later(self, delay, callback, *args):
+        """Run callback after delay seconds; returns a handle for cancel()"""
+        handle = [time.monotonic() + delay, next(self.counter), callback, args, False]
+        with self.lock:
+            heapq.heappush(self.timers, handle)
+        if not self.in_loop():
+            self.wake()
+        return handle
+
+    @staticmethod
+    def cancel(handle):
+        if handle is not None:
+            handle[4] = True
+
+    def watch(self, fileobj, events, callback):
+        """Call callback() whenever fileobj is ready for `events`"""
+        if not self.in_loop() and self.thread is not None:
+            self.call_soon_threadsafe(self.watch, fileobj, events, callback)
+            return
+        try:
+            self.selector.modify(fileobj, events, callback)
+        except KeyError:
+            self.selector.register(fileobj, events, callback)
+
+    def unwatch(self, fileobj):
+        if not self.in_loop() and self.thread is not None:
+            self.call_soon_threadsafe(self.unwatch, fileobj)
+            return
+        try:
+            self.selector.unregister(fileobj)
+        except (KeyError, ValueError):
+            pass
+
+    def run_callback(self, callback, *args):
+        try:
+            callback(*args)
+        except Exception as e:
+            # stderr: stdout may be carrying batch results
+            print(f"Event loop callback {getattr(callback, '__name__', callback)} failed: {e}", file=sys.stderr)
+
+    def run(self):
+        while self.running:
+            with self.lock:
+                while self.timers and self.timers[0][4]:
+                    heapq.heappop(self.timers)
+                timeout = None
+                if self.ready:
+                    timeout = 0
+                elif self.timers:
+                    timeout = max(0.0, self.timers[0][0] - time.monotonic())
+            for key, _ in self.selector.select(timeout):
+                self.run_callback(key.data)
+
+            now = time.monotonic()
+            due = []
+            with self.lock:
+                while self.timers and self.timers[0][0] <= now:
+                    due.append(heapq.heappop(self.timers))
+            for _, _, callback, args, cancelled in due:
+                if not cancelled:
+                    self.run_callback(callback, *args)
+
+            for _ in range(len(self.ready)):
+                callback, args = self.ready.popleft()
+                self.run_callback(callback, *args)
+
+    def probe_tcp(self, port, callback, timeout=0.25):
+        """Non-blocking connect to a local port; calls callback(bool) on the loop"""
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setblocking(False)
+        state = {"done": False}
+
+        def finish(ok):
+            if state["done"]:
+                return
+            state["done"] = True
+            self.cancel(state.get("timer"))
+            self.unwatch(sock)
+            sock.close()
+            callback(ok)
+
+        def connected():
+            finish(sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR) == 0)
+
+        err = sock.connect_ex(("127.0.0.1", port))
+        if err == 0:
+            self.call_soon_threadsafe(finish, True)
+        elif err in (errno.EINPROGRESS, errno.EAGAIN):
+            state["timer"] = self.call_later(timeout, finish, False)
+            self.watch(sock, selectors.EVENT_WRITE, connected)
+        else:
+            self.call_soon_threadsafe(finish, False)
+
+    def probe_http(self, port, callback, timeout=2.0):
+        """Non-blocking GET / on a local port; calls callback(bool) on the loop.
+
+        Any HTTP status line counts as healthy: the point is that the
+        server still accepts and answers requests.
+        """
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setblocking(False)
+        state = {"done": False}
+
+        def finish(ok):
+            if state["done"]:
+                return
+            state["done"] = True
+            self.cancel(state["timer"])
+            self.unwatch(sock)
+            sock.close()
+            callback(ok)
+
+        def connected():
+            if sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR) != 0:
+                finish(False)
+                return
+            try:
+                sock.send(b"GET / HTTP/1.1\r\nHost: 127.0.0.1\r\nConnection: close\r\n\r\n")
+            except OSError:
+                finish(False)
+                return
+            self.watch(sock, selectors.EVENT_READ, answered)
+
+        def answered():
+            try:
+                data = sock.recv(16)
+            except BlockingIOError:
+                return
+            except OSError:
+                data = b""
+            finish(data.startswith(b"HTTP/"))
+
+        state["timer"] = self.call_later(timeout, finish, False)
+        err = sock.connect_ex(("127.0.0.1", port))
+        if err in (0, errno.EINPROGRESS, errno.EAGAIN):
+            self.watch(sock, selectors.EVENT_WRITE, connected)
+        else:
+            self.call_soon_threadsafe(finish, False)
+
+
+class ChildProcess:
+    """Child process supervised by an EventLoop.
+
+    stdout is read without blocking and handed to on_output(bytes) as it
+    arrives. on_exit(returncode) fires once the process has exited and its
+    output is drained; on Linux a pidfd makes exit itself an event.
+    """
+
+    def __init__(self, loop, argv, on_output, on_exit, merge_stderr=False, cpus=None,
+                 detach=False):
+        self.loop = loop
+        self.on_output = on_output
+        self.on_exit = on_exit
+        self.proc = subprocess.Popen(
+            argv,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT if merge_stderr else None,
+            # A detached child gets its own session (no Ctrl-C from our
+            # terminal) and keeps SIGPIPE ignored, so it can outlive us
+            # after its output pipe closes
+            start_new_session=detach,
+            restore_signals=not detach,
+        )
+        self.pid = self.proc.pid
+        if cpus:
+            os.sched_setaffinity(self.pid, cpus)
+        self.stdout = self.proc.stdout
+        os.set_blocking(self.stdout.fileno(), False)
+        self.eof = False
+        self.exited = False
+        self.reported = False
+        self.pidfd = None
+        if hasattr(os, "pidfd_open"):
+            try:
+                self.pidfd = os.pidfd_open(self.pid)
+                loop.watch(self.pidfd, selectors.EVENT_READ, self.on_pidfd)
+            except OSError:
+                self.pidfd = None
+        loop.watch(self.stdout, selectors.EVENT_READ, self.on_readable)
+
+    @property
+    def running(self):
+        return not self.reported
+
+    def on_readable(self):
+        fd = self.stdout.fileno()
+        while True:
+            try:
+                data = os.read(fd, 65536)
+            except BlockingIOError:
+                return
+            except OSError:
+                data = b""
+            if not data:
+                self.eof = True
+                self.loop.unwatch(self.stdout)
+                self.stdout.close()
+                self.check_exit()
+                return
+            self.on_output(data)
+
+    def on_pidfd(self):
+        self.exited = True
+        self.loop.unwatch(self.pidfd)
+        os.close(self.pidfd)
+        self.pidfd = None
+        self.check_exit()
+
+    def check_exit(self):
+        if self.reported or not self.eof:
+            return
+        returncode = self.proc.poll()
+        if returncode is None:
+            if self.pidfd is not None:
+                return  # The pidfd will tell us
+            # No pidfd: output closed first, look again shortly
+            self.loop.call_later(0.1, self.check_exit)
+            return
+        self.reported = True
+        self.on_exit(returncode)
+
+    def send_signal(self, sig):
+        if self.proc.poll() is None:
+            try:
+                self.proc.send_signal(sig)
+            except ProcessLookupError:
+                pass
+
+    def terminate(self, grace=5.0):
+        """SIGTERM now, SIGKILL if it is still around after `grace` seconds"""
+        self.send_signal(signal.SIGTERM)
+        self.loop.call_later(grace, self.send_signal, signal.SIGKILL)
+
+
+class ServerSupervisor:
+    """Keeps the pool's whisper-servers running, from an EventLoop.
+
+    A server already listening on an instance's port is adopted; otherwise
+    one is launched and warmed up. Servers are health-checked while idle.
+    Ones we launched are restarted with backoff when they crash or stop
+    answering. After SERVER_IDLE_SECONDS without requests a server is
+    stopped to free the model's memory, and wake() starts it again.
+
+    Lease files in SERVER_LEASE_DIR count the clients using each port, so
+    a shared server is only stopped (when idle or at exit) once no other
+    client holds a lease on it. The client that launched a server records
+    its pid there too, so whichever client drops the last lease can stop
+    it, even if it only adopted the server.
+    """
+
+    def __init__(self, loop, pool, server_path, model_path, on_status, on_change):
+        self.loop = loop
+        self.pool = pool
+        self.server_path = server_path
+        self.model_path = model_path
+        self.on_status = on_status
+        self.on_change = on_change  # Called on the loop after any state change
+
+    def start(self):
+        for instance in self.pool.instances:
+            self.loop.call_soon_threadsafe(self.launch, instance)
+        self.loop.call_later(SERVER_HEALTH_INTERVAL, self.tick)
+
+    def wake(self):
+        """Thread-safe: note activity and bring back servers unloaded while idle"""
+        self.loop.call_soon_threadsafe(self.on_wake)
+
+    def on_wake(self):
+        for instance in self.pool.instances:
+            instance.last_used = time.monotonic()
+            if instance.state == "idle":
+                self.launch(instance)
+
+    def set_state(self, instance, state):
+        instance.state = state
+        instance.healthy = state == "up"
+        self.on_change()
+
+    # Leases
+
+    def lease_path(self, port):
+        return os.path.join(SERVER_LEASE_DIR, f"{port}.{os.getpid()}.lease")
+
+    def take_lease(self, instance):
+        if instance.leased:
+            return
+        try:
+            os.makedirs(SERVER_LEASE_DIR, exist_ok=True)
+            open(self.lease_path(instance.port), "w").close()
+            instance.leased = True
+        except OSError as e:
+            self.on_status(f"[WARN] Could not write server lease: {str(e)}\n")
+
+    def drop_lease(self, instance):
+        instance.leased = False
+        try:
+            os.remove(self.lease_path(instance.port))
+        except OSError:
+            pass
+
+    def pid_path(self, port):
+        return os.path.join(SERVER_LEASE_DIR, f"{port}.pid")
+
+    def record_pid(self, instance, pid):
+        try:
+            os.makedirs(SERVER_LEASE_DIR, exist_ok=True)
+            with open(self.pid_path(instance.port), "w") as f:
+                f.write(f"{pid}\n")
+        except OSError as e:
+            self.on_status(f"[WARN] Could not record server pid: {str(e)}\n")
+
+    def forget_pid(self, instance, pid):
+        """Remove the pid file if it still names `pid`"""
+        try:
+            with open(self.pid_path(instance.port)) as f:
+                if int(f.read().strip() or 0) == pid:
+                    os.remove(self.pid_path(instance.port))
+        except (OSError, ValueError):
+            pass
+
+    def stop_adopted(self, instance):
+        """SIGTERM a server another client launched; True if one was signalled"""
+        try:
+            with open(self.pid_path(instance.port)) as f:
+                pid = int(f.read().strip())
+            # The pid may have been reused since; only signal our server
+            with open(f"/proc/{pid}/cmdline", "rb") as f:
+                argv = f.read().split(b"\0")
+        except (OSError, ValueError):
+            return False
+        if str(instance.port).encode() not in argv:
+            self.forget_pid(instance, pid)
+            return False
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except OSError:
+            return False
+        self.forget_pid(instance, pid)
+        return True
+
+    def other_leases(self, port):
+        """Number of other live clients leasing port; stale leases are removed"""
+        try:
+            names = os.listdir(SERVER_LEASE_DIR)
+        except OSError:
+            return 0
+        count = 0
+        for name in names:
+            parts = name.split(".")
+            if len(parts) != 3 or parts[0] != str(port) or parts[2] != "lease":
+                continue
+            try:
+                pid = int(parts[1])
+            except ValueError:
+                continue
+            if pid == os.getpid():
+                continue
+            try:
+                os.kill(pid, 0)
+            except ProcessLookupError:
+                # That client died without cleaning up
+                try:
+                    os.remove(os.path.join(SERVER_LEASE_DIR, name))
+                except OSError:
+                    pass
+                continue
+            except PermissionError:
+                pass
+            count += 1
+        return count
+
+    # Starting
+
+    def launch(self, instance):
+        """Reuse our own or someone else's server on the port, or spawn one"""
+        if instance.state in ("starting", "up"):
+            return
+        self.set_state(instance, "starting")
+        if instance.process is not None and instance.process.running:
+            # Left running for other clients while we were idle
+            self.server_up(instance)
+            return
+
+        def probed(ok):
+            if ok:
+                self.on_status(f"[INFO] Whisper server on port {instance.port} is already running\n")
+                self.server_up(instance)
+            else:
+                self.spawn(instance)
+
+        self.loop.probe_tcp(instance.port, probed)
+
+    def spawn(self, instance):
+        port = instance.port
+        cmd = instance.command(self.server_path, self.model_path)
+        # stderr: stdout may be carrying batch results
+        print(f"Executing: {' '.join(cmd)}", file=sys.stderr)
+        self.on_status(f"[INFO] Starting Whisper server on port {port}...\n")
 
-PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
-WHISPER_SERVER_PATH = f"{PROJECT_ROOT}/whisper.cpp/build/bin/whisper-server"
-WHISPER_MODEL_PATH = f"{PROJECT_ROOT}/whisper.cpp/models/ggml-{MODEL}.bin"
+        deadline = time.monotonic() + SERVER_START_TIMEOUT
+        state = {"delay": 0.05, "timer": None, "tail": b""}
 
-# Sox threshold for recording
-THRESH_START = 2.0
+        def on_output(data):
+            # The server's output is watched for its "listening" line instead
+            # of guessing with sleeps; it keeps being drained afterwards so
+            # the server never blocks on a full pipe
+            if instance.state != "starting":
+                return
+            lines = (state["tail"] + data).split(b"\n")
+            state["tail"] = lines.pop()
+            if any(b"listening" in line for line in lines):
+                self.loop.cancel(state["timer"])
+                probe()
+
+        def on_exit(returncode):
+            self.loop.cancel(state["timer"])
+            self.server_exited(instance, process, returncode)
+
+        def probe():
+            self.loop.probe_tcp(port, probed)
+
+        def probed(ok):
+            if instance.state != "starting" or instance.process is not process:
+                return
+            if ok:
+                self.loop.cancel(state["timer"])
+                threading.Thread(target=self.warm_up, args=(instance,), daemon=True).start()
+            elif time.monotonic() >= deadline:
+                instance.stopping = "restart"
+                process.terminate()
+                self.start_failed(instance, "did not start in time")
+            else:
+                # Short backoff; the "listening" line cuts any wait short
+                state["timer"] = self.loop.call_later(state["delay"], probe)
+                state["delay"] = min(state["delay"] * 2, 1.0)
+
+        try:
+            process = ChildProcess(
+                self.loop, cmd, on_output, on_exit,
+                merge_stderr=True, cpus=instance.cpus, detach=True,
+            )
+        except OSError as e:
+            self.on_status(f"[ERROR] Whisper server on port {port} {str(e)}\n")
+            self.set_state(instance, "failed")
+            return
+        instance.process = process
+        self.record_pid(instance, process.pid)
+        probe()
+
+    def warm_up(self, instance):
+        """Page in the model and allocate compute buffers before real speech"""
+        port = instance.port
+        warmup_start = time.time()
+        try:
+            silence = AudioSegment(bytes(int(WARMUP_SECONDS * SAMPLE_RATE) * SAMPLE_WIDTH))
+            client = InferenceClient("127.0.0.1", port)
+            client.infer(silence.wav_parts(), "warmup.wav")
+            client.close()
+            self.on_status(f"[INFO] Warm-up inference on port {port} took {time.time() - warmup_start:.2f}s\n")
+        except Exception as e:
+            self.on_status(f"[WARN] Warm-up inference on port {port} failed: {str(e)}\n")
+        self.on_status(f"[INFO] Whisper server on port {port} started successfully\n")
+        self.loop.call_soon_threadsafe(self.server_up, instance)
+
+    def server_up(self, instance):
+        if instance.state != "starting":
+            return
+        STARTUP.mark(f"server {instance.port} ready")
+        instance.ever_up = True
+        instance.up_since = time.monotonic()
+        instance.last_used = time.monotonic()
+        instance.health_failures = 0
+        self.take_lease(instance)
+        self.set_state(instance, "up")
+
+    # Failures
+
+    def start_failed(self, instance, reason):
+        if not instance.ever_up:
+            # Never came up at all: most likely a bad path or model
+            self.on_status(f"[ERROR] Whisper server on port {instance.port} {reason}\n")
+            self.set_state(instance, "failed")
+        else:
+            self.restart(instance, reason)
+
+    def server_exited(self, instance, process, returncode):
+        self.forget_pid(instance, process.pid)
+        if instance.process is process:
+            instance.process = None
+        reason, instance.stopping = instance.stopping, None
+        if reason in ("idle", "exit"):
+            return
+        if instance.state == "starting" and reason is None:
+            self.start_failed(instance, f"exited with status {returncode}")
+        elif instance.state in ("up", "restarting"):
+            self.restart(instance, f"exited with status {returncode}")
+
+    def restart(self, instance, reason):
+        if instance.state == "restarting" and instance.process is None:
+            return  # Already scheduled
+        instance.restarts += 1
+        if instance.restarts > SERVER_MAX_RESTARTS:
+            self.on_status(f"[ERROR] Whisper server on port {instance.port} {reason}; giving up after {SERVER_MAX_RESTARTS} restarts\n")
+            self.set_state(instance, "failed")
+            return
+        delay = min(2.0 ** (instance.restarts - 1), SERVER_RESTART_MAX_DELAY)
+        self.on_status(f"[WARN] Whisper server on port {instance.port} {reason}; restarting in {delay:.0f}s\n")
+        self.set_state(instance, "restarting")
+        if instance.process is not None:
+            # Still running but unresponsive; its exit comes back through here
+            instance.stopping = "restart"
+            instance.process.terminate()
+        self.loop.call_later(delay, self.relaunch, instance)
+
+    def relaunch(self, instance):
+        if instance.state != "restarting":
+            return
+        if instance.process is not None and instance.process.running:
+            # SIGKILL is due shortly; try again once it is gone
+            self.loop.call_later(1.0, self.relaunch, instance)
+            return
+        self.set_state(instance, "stopped")
+        self.launch(instance)
+
+    # Periodic checks
+
+    def tick(self):
+        self.loop.call_later(SERVER_HEALTH_INTERVAL, self.tick)
+        now = time.monotonic()
+        for instance in self.pool.instances:
+            if instance.state == "idle":
+                # Kept running only for other clients; stop it once they are gone
+                if instance.process is not None and not self.other_leases(instance.port):
+                    self.stop(instance, "idle")
+                continue
+            if instance.state != "up" or instance.outstanding:
+                # Busy servers prove themselves through the pool's requests
+                continue
+            if instance.up_since and now - instance.up_since > 60:
+                instance.restarts = 0
+            if SERVER_IDLE_SECONDS is not None and now - instance.last_used >= SERVER_IDLE_SECONDS:
+                self.unload(instance)
+                continue
+            self.loop.probe_http(instance.port, lambda ok, instance=instance: self.checked(instance, ok))
+
+    def checked(self, instance, ok):
+        if instance.state != "up":
+            return
+        if ok:
+            instance.health_failures = 0
+            return
+        instance.health_failures += 1
+        if instance.health_failures >= SERVER_HEALTH_FAILURES:
+            instance.health_failures = 0
+            self.restart(instance, "stopped answering")
+
+    # Stopping
+
+    def stop(self, instance, reason):
+        if instance.process is not None and instance.process.running:
+            instance.stopping = reason
+            instance.process.terminate()
+
+    def unload(self, instance):
+        """Stop using an idle server; stop the process too if nobody else is"""
+        self.drop_lease(instance)
+        others = self.other_leases(instance.port)
+        if instance.process is None:
+            if not others and self.stop_adopted(instance):
+                self.on_status(f"[INFO] Whisper server on port {instance.port} idle; unloading model\n")
+            else:
+                self.on_status(f"[INFO] Whisper server on port {instance.port} idle; releasing it\n")
+        elif others:
+            self.on_status(f"[INFO] Whisper server on port {instance.port} idle; still used by {others} other client(s)\n")
+        else:
+            self.on_status(f"[INFO] Whisper server on port {instance.port} idle; unloading model\n")
+            self.stop(instance, "idle")
+        self.set_state(instance, "idle")
+
+    def shutdown(self):
+        """At exit: drop our leases and stop servers no other client uses"""
+        for instance in self.pool.instances:
+            self.drop_lease(instance)
+            if instance.process is None:
+                # Adopted: stop it if we were its last user
+                if not self.other_leases(instance.port) and self.stop_adopted(instance):
+                    print(f"Terminated Whisper server on port {instance.port}", file=sys.stderr)
+                continue
+            others = self.other_leases(instance.port)
+            if others:
+                print(f"Leaving Whisper server on port {instance.port} running for {others} other client(s)", file=sys.stderr)
+            else:
+                instance.stopping = "exit"
+                instance.process.send_signal(signal.SIGTERM)
+                print(f"Terminated Whisper server on port {instance.port}", file=sys.stderr)
+
+    def status(self):
+        return " ".join(f"{inst.port}:{inst.state}" for inst in self.pool.instances)
+
+
+class TranscriptionService:
+    """The transcription core shared by the GUI and the batch CLI.
+
+    Owns the server pool (routed or not), its supervisor and a readiness
+    event, and turns AudioSegments into cleaned-up text: encode in the
+    wire format, wait for a server, POST, clean the transcript.
+    """
+
+    def __init__(self, loop, on_status=print, on_change=None, port=SERVER_PORT,
+                 server_path=WHISPER_SERVER_PATH, model_path=WHISPER_MODEL_PATH, pool=None):
+        self.on_status = on_status
+        self.on_change = on_change
+        self.wire_format = WIRE_FORMAT
+        # `pool` replaces the one built from the settings (the benchmark's fakes)
+        self.pool = pool
+        if pool is None:
+            if not ROUTING_MODE:
+                self.pool = ServerPool(port)
+            else:
+                # The small model's server takes one more share of the cores
+                slots = SERVER_INSTANCES + 1
+                self.pool = ModelRouter(
+                    ServerPool(port, slots=slots),
+                    ServerPool(SMALL_SERVER_PORT, count=1, model_path=SMALL_MODEL_PATH,
+                               slot=SERVER_INSTANCES, slots=slots),
+                )
+        # Set while at least one required server is up; requests wait on it
+        self.ready = threading.Event()
+        self.supervisor = ServerSupervisor(
+            loop, self.pool, server_path, model_path,
+            on_status=on_status, on_change=self.servers_changed,
+        )
+
+    def start(self):
+        self.supervisor.start()
+
+    def shutdown(self):
+        self.supervisor.shutdown()
+
+    def servers_changed(self):
+        if any(instance.healthy for instance in self.pool.required):
+            self.ready.set()
+        else:
+            self.ready.clear()
+        if self.on_change is not None:
+            self.on_change()
+
+    @property
+    def failed(self):
+        return all(instance.state == "failed" for instance in self.pool.required)
+
+    def request(self, segment):
+        """POST one segment to the whisper server and return the parsed JSON"""
+        # Audio captured while the server is still starting (or coming back
+        # from an idle unload) just waits here
+        self.supervisor.wake()
+        while not self.ready.wait(0.25):
+            if segment.cancelled:
+                raise SegmentCancelled(segment.cancelled)
+        try:
+            parts, filename, content_type = segment.encode(self.wire_format)
+        except OSError as e:
+            self.on_status(f"[WARN] {str(e)}; uploading WAV instead\n")
+            self.wire_format = "wav"
+            parts, filename, content_type = segment.encode(self.wire_format)
+        segment.mark("encoded")
+        return self.pool.infer(
+            parts, filename, content_type=content_type,
+            duration=segment.duration, marks=segment.marks, token=segment,
+        )
+
+    def transcribe(self, segment):
+        """Pipeline worker step: returns cleaned text, "" if nothing to type"""
+        response_data = self.request(segment)
+        if "text" not in response_data:
+            self.on_status("[WARN] empty response\n")
+            return ""
+        text = clean_transcript(response_data["text"])
+        segment.mark("filtered")
+        return text
+
+    def transcribe_pcm(self, pcm):
+        """Transcribe raw PCM, returning cleaned text (or "" on failure)"""
+        try:
+            response_data = self.request(AudioSegment(pcm))
+        except Exception as e:
+            self.on_status(f"[ERROR] Streaming: {str(e)}\n")
+            return ""
+        return clean_transcript(response_data.get("text", ""))
+
+
+class UIUpdater:
+    """Coalesces UI updates from any thread into rate-limited repaints.
+
+    Producers only put messages on a queue (the level meter just overwrites
+    its latest reading) and poke a wake-up pipe that Tk watches with a file
+    handler, so they never touch Tk and an idle UI never wakes up. A pump
+    runs at most UI_FPS times a second: all text for a widget goes in as a
+    single insert, and each pane is trimmed to its last UI_MAX_LINES lines.
+    """
+
+    def __init__(self, root, fps=UI_FPS, max_lines=UI_MAX_LINES, echo=CONSOLE_ECHO):
+        self.root = root
+        self.interval = max(1, int(1000 / fps))
+        self.max_lines = max_lines
+        self.echo = echo
+        self.messages = queue.SimpleQueue()
+        self.render_meter = None
+        self.meter = None  # Latest meter reading, replaced wholesale by producers
+        self.meter_shown = None
+        self.scheduled = False
+        self.last_pump = 0.0
+        self.wake_r, self.wake_w = os.pipe()
+        os.set_blocking(self.wake_r, False)
+        os.set_blocking(self.wake_w, False)
+
+    def append(self, widget, text, console=None):
+        """Append text to a Text widget; `console` overrides what gets echoed"""
+        self.messages.put(("append", widget, text, text if console is None else console))
+        self.wake()
+
+    def call(self, fn, *args):
+        """Run fn(*args) on the Tk thread, ordered with the appends"""
+        self.messages.put(("call", fn, args, None))
+        self.wake()
+
+    def set_meter(self, reading):
+        self.meter = reading
+        self.wake()
+
+    def wake(self):
+        try:
+            os.write(self.wake_w, b"\0")
+        except (BlockingIOError, OSError):
+            pass  # A wake-up is already pending
+
+    def start(self, render_meter=None):
+        """Begin pumping; render_meter(reading) draws the latest meter reading"""
+        self.render_meter = render_meter
+        try:
+            self.root.tk.createfilehandler(self.wake_r, tk.READABLE, self.on_wake)
+        except (AttributeError, tk.TclError):
+            # No file handlers on this Tk build; fall back to a fixed rate
+            self.poll()
+        self.wake()
+
+    def poll(self):
+        self.on_wake()
+        self.root.after(self.interval, self.poll)
+
+    def on_wake(self, *args):
+        try:
+            while os.read(self.wake_r, 4096):
+                pass
+        except BlockingIOError:
+            pass
+        if self.scheduled:
+            return
+        # Never repaint more often than UI_FPS
+        wait = self.last_pump + self.interval / 1000.0 - time.monotonic()
+        self.scheduled = True
+        self.root.after(max(0, int(wait * 1000)), self.pump)
+
+    def pump(self):
+        self.scheduled = False
+        self.last_pump = time.monotonic()
+        batch = {}
+        console = []
+        while True:
+            try:
+                kind, target, payload, echo = self.messages.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "append":
+                batch.setdefault(target, []).append(payload)
+                console.append(echo)
+            else:
+                self.flush(batch)
+                batch = {}
+                target(*payload)
+        self.flush(batch)
+        if self.echo and console:
+            sys.stdout.write("".join(console))
+            sys.stdout.flush()
+
+        meter = self.meter
+        if meter is not None and meter != self.meter_shown and self.render_meter is not None:
+            self.render_meter(meter)
+            self.meter_shown = meter
+
+    def flush(self, batch):
+        for widget, texts in batch.items():
+            widget.insert(tk.END, "".join(texts))
+            self.trim(widget)
+            widget.see(tk.END)
+
+    def trim(self, widget):
+        # With a trailing newline the last "line" is the empty one after it
+        lines = int(widget.index("end-1c").split(".")[0])
+        if lines - self.max_lines > 1:
+            widget.delete("1.0", f"{lines - self.max_lines}.0")
+
+
+class StartupProfiler:
+    """Timestamps of startup phases, printed by --profile-startup.
+
+    Phases that finish after the report (capture, server readiness) are
+    printed as they happen.
+    """
+
+    def __init__(self, start):
+        self.start = start
+        self.marks = []  # (name, perf_counter)
+        self.reported = False
+
+    def mark(self, name):
+        now = time.perf_counter()
+        self.marks.append((name, now))
+        if PROFILE_STARTUP and self.reported:
+            # Phases that finish after the window is up
+            print(f"[startup] {name:<22}{(now - self.start) * 1000:>8.1f} ms", file=sys.stderr)
+
+    def report(self):
+        """Print the phases so far; times are from the first line of this module"""
+        if not PROFILE_STARTUP or self.reported or not self.marks:
+            return
+        self.reported = True
+        lines = []
+        previous = self.start
+        for name, when in self.marks:
+            lines.append(f"{name:<22}{(when - self.start) * 1000:>8.1f} ms  (+{(when - previous) * 1000:.1f})")
+            previous = when
+        total = (previous - self.start) * 1000
+        verdict = "within" if total <= STARTUP_BUDGET_MS else "OVER"
+        lines.append(
+            f"{self.marks[-1][0]} after {total:.1f} ms, {verdict} the {STARTUP_BUDGET_MS} ms budget "
+            f"(plus interpreter startup)"
+        )
+        print("\n".join(f"[startup] {line}" for line in lines), file=sys.stderr)
+
+STARTUP = StartupProfiler(IMPORT_START)
+
+
+def resolve_font():
+    """First installed font of PREFERRED_FONTS (or None), cached on disk"""
+    try:
+        with open(FONT_CACHE_FILE) as f:
+            cached = json.load(f)
+        if cached.get("preferred") == PREFERRED_FONTS:
+            return cached.get("font")
+    except (OSError, ValueError, AttributeError):
+        pass
+    # Slow with large font sets, so only done once
+    families = {family.lower() for family in tkfont.families()}
+    chosen_font = next((name for name in PREFERRED_FONTS if name.lower() in families), None)
+    try:
+        os.makedirs(os.path.dirname(FONT_CACHE_FILE), exist_ok=True)
+        with open(FONT_CACHE_FILE, "w") as f:
+            json.dump({"preferred": PREFERRED_FONTS, "font": chosen_font}, f)
+    except OSError as e:
+        print(f"Could not cache font choice: {e}")
+    return chosen_font
 
-FONT_SIZE = 12
 
 class VoiceTypingGUI:
     def __init__(self, root):
         self.MODEL = MODEL
         self.SERVER_PORT = SERVER_PORT
-        self.SERVER_URL = f"http://127.0.0.1:{self.SERVER_PORT}/inference"
         self.WHISPER_SERVER_PATH = WHISPER_SERVER_PATH
         self.WHISPER_MODEL_PATH = WHISPER_MODEL_PATH
 
         self.root = root
         self.root.title("Voice Typing")
-        self.root.geometry("600x450")
+        self.root.geometry("600x620")
 
         self.RECORDING = False
-        self.AUDIO_queue = queue.Queue()
-        self.keyboard = pynput.keyboard.Controller()
+        # Child processes, probes, timers and the command socket all live here
+        self.loop = EventLoop()
+        self.loop.start()
+        self.capture = None
+        self.ui = UIUpdater(self.root, echo=CONSOLE_ECHO)
+        self.ring = PCMRingBuffer(RING_SECONDS * SAMPLE_RATE * SAMPLE_WIDTH)
+        self.chunker = UtteranceChunker(self.ring)
+        # Servers, requests and transcript cleanup; this class is only the
+        # front-end for capture, display and typing
+        self.service = TranscriptionService(
+            self.loop, on_status=self.update_STATUS_display, on_change=self.on_server_change,
+            port=self.SERVER_PORT, server_path=self.WHISPER_SERVER_PATH,
+            model_path=self.WHISPER_MODEL_PATH,
+        )
+        self.pool = self.service.pool
+        self.supervisor = self.service.supervisor
+        self.tracer = LatencyTracer(path=TRACE_FILE)
+        self.vad = VoiceActivityDetector()
+        self.meter = LevelMeter()
+        self.typer = TextTyper(
+            on_status=self.update_STATUS_display
+        )
+        # Created before setup_ui, whose latency panel reports on it
+        self.pipeline = TranscriptionPipeline(
+            self.service.transcribe,
+            self.commit_text,
+            on_status=self.update_STATUS_display,
+            # Keep every server instance busy
+            workers=max(INFERENCE_WORKERS, len(self.pool.instances)),
+            gate=SegmentGate(self.vad),
+        )
+        self.pipeline.pause_deadlines()  # Until the server is up
 
         # Set up bindings first
         self.root.bind("<space>", lambda event: self.toggle_recording())
-        self.root.bind("<Escape>", lambda event: self.on_closing())
-        self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
+        self.root.bind("<Escape>", lambda event: self.on_escape())
+        self.root.bind("<Delete>", lambda event: self.discard_pending())
+        self.root.protocol("WM_DELETE_WINDOW", self.on_escape)
 
         # Then set up UI and start operations
+        STARTUP.mark("gui state")
         self.setup_ui()
-        self.start_whisper_server()
-        self.processing_thread = threading.Thread(
-            target=self.process_audio_queue, daemon=True
-        )
-        self.processing_thread.start()
+        STARTUP.mark("setup_ui")
+
+        self.streamer = None
+        if STREAMING_MODE:
+            self.streamer = StreamingTranscriber(
+                self.ring,
+                self.service.transcribe_pcm,
+                lambda delta, tail, final: self.ui.call(
+                    self.update_stream_display, delta, tail, final
+                ),
+                self.type_text,
+                self.erase_text,
+            )
+            threading.Thread(target=self.streamer.run, daemon=True).start()
+
+        # Accept commands from later invocations on the singleton socket
+        if singleton_socket is not None:
+            singleton_socket.setblocking(False)
+            self.loop.watch(singleton_socket, selectors.EVENT_READ, self.accept_command)
 
+        # SIGTERM/SIGINT wake Tk through the UI pipe and close us cleanly
+        signal.set_wakeup_fd(self.ui.wake_w)
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(sig, lambda signum, frame: self.ui.call(self.on_closing))
+
+        # Capture starts right away; the server probe and the rest wait
+        # until the window is on screen
         self.root.focus_force()
         self.start_recording()
+        self.root.after_idle(self.on_window_shown)
+
+    def on_window_shown(self):
+        STARTUP.mark("window mapped")
+        STARTUP.report()
+        threading.Thread(target=import_http, daemon=True).start()
+        self.start_whisper_server()
 
     def setup_ui(self):
         # Configure default font size for the entire application
@@ -68,15 +2722,7 @@ class VoiceTypingGUI:
         text_font = tkfont.nametofont("TkTextFont")
         
         # Try to use a nicer font with fallback to system default
-        preferred_fonts = ['helvetica']
-        
-        # Find the first available font from our preferred list
-        chosen_font = None
-        print("Available fonts:", tkfont.families())
-        for font_name in preferred_fonts:
-            if font_name.lower() in [f.lower() for f in tkfont.families()]:
-                chosen_font = font_name
-                break
+        chosen_font = resolve_font()
         
         # Configure fonts with the chosen font or keep default if none available
         if chosen_font:
@@ -102,7 +2748,7 @@ class VoiceTypingGUI:
         # Model and port info
         self.config_label = ttk.Label(
             info_frame, 
-            text=f"Model: {self.MODEL} | Port: {self.SERVER_PORT} | Thresholds: {THRESH_START}%",
+            text=self.config_text(),
         )
         self.config_label.pack(pady=2, side=tk.LEFT)
         
@@ -138,6 +2784,13 @@ class VoiceTypingGUI:
         self.thresh_var = tk.StringVar(value=str(THRESH_START))
         self.thresh_entry = ttk.Entry(threshold_container, width=3, textvariable=self.thresh_var)
         self.thresh_entry.pack(side=tk.LEFT, padx=1)
+
+        # End-of-speech timeout in ms
+        end_label = ttk.Label(threshold_container, text="End:")
+        end_label.pack(side=tk.LEFT, padx=1)
+        self.end_var = tk.StringVar(value=str(END_SILENCE_MS))
+        self.end_entry = ttk.Entry(threshold_container, width=4, textvariable=self.end_var)
+        self.end_entry.pack(side=tk.LEFT, padx=1)
         
         # Update button (inline)
         update_button = ttk.Button(threshold_container, text="Set", command=self.update_thresholds)
@@ -154,7 +2807,7 @@ class VoiceTypingGUI:
         status_frame = ttk.LabelFrame(self.root, text="System Status")
         status_frame.pack(padx=10, pady=5, fill="both", expand=True)
         status_frame2 = ttk.LabelFrame(self.root, text="Recording Status")
-        status_frame2.pack(padx=10, pady=5, fill="both", expand=True)
+        status_frame2.pack(padx=10, pady=5, fill="x")
 
         self.status_display = tk.Text(status_frame, height=5, wrap="word")
         status_scrollbar = ttk.Scrollbar(
@@ -163,15 +2816,27 @@ class VoiceTypingGUI:
         self.status_display.configure(yscrollcommand=status_scrollbar.set)
         self.status_display.pack(side=tk.LEFT, padx=5, pady=5, fill="both", expand=True)
         status_scrollbar.pack(side=tk.RIGHT, fill="y")
-        self.status_display2 = tk.Text(status_frame2, height=1, wrap="word")
-        status_scrollbar2 = ttk.Scrollbar(
-            status_frame2, orient="vertical", command=self.status_display2.yview
+        style = ttk.Style(self.root)
+        for name, color in (("Blue", "#4a90d9"), ("Green", "#3cb043"), ("Red", "#d0312d")):
+            style.configure(f"{name}.Horizontal.TProgressbar", background=color)
+        self.volume_bar = ttk.Progressbar(
+            status_frame2, orient="horizontal", mode="determinate", maximum=100,
+            style="Blue.Horizontal.TProgressbar",
         )
-        self.status_display2.configure(yscrollcommand=status_scrollbar2.set)
-        self.status_display2.pack(
-            side=tk.LEFT, padx=5, pady=5, fill="both", expand=True
+        self.volume_bar.pack(side=tk.LEFT, padx=5, pady=5, fill="x", expand=True)
+        self.volume_value = ttk.Label(status_frame2, text=f"{METER_FLOOR_DB:.1f} dB", width=9)
+        self.volume_value.pack(side=tk.LEFT, padx=5)
+        self.meter_label = ttk.Label(status_frame2, text="", width=22)
+        self.meter_label.pack(side=tk.LEFT, padx=5)
+        self.clipped_shown = 0
+
+        latency_frame = ttk.LabelFrame(self.root, text="Latency")
+        latency_frame.pack(padx=10, pady=5, fill="x")
+        self.latency_label = ttk.Label(
+            latency_frame, text="No segments yet", font="TkFixedFont", justify=tk.LEFT
         )
-        status_scrollbar2.pack(side=tk.RIGHT, fill="y")
+        self.latency_label.pack(padx=5, pady=2, anchor="w")
+        self.refresh_latency_display()
 
         transcribe_frame = ttk.LabelFrame(self.root, text="Transcribed Text")
         transcribe_frame.pack(padx=10, pady=5, fill="both", expand=True)
@@ -180,81 +2845,45 @@ class VoiceTypingGUI:
             transcribe_frame, orient="vertical", command=self.transcribe_display.yview
         )
         self.transcribe_display.configure(yscrollcommand=transcribe_scrollbar.set)
+        self.transcribe_display.tag_configure("provisional", foreground="gray")
         self.transcribe_display.pack(
             side=tk.LEFT, padx=5, pady=5, fill="both", expand=True
         )
         transcribe_scrollbar.pack(side=tk.RIGHT, fill="y")
 
-        ttk.Label(self.root, text="Space: Toggle recording | Esc: Quit").pack(pady=5)
+        esc_action = "Hide" if DAEMON_MODE else "Quit"
+        ttk.Label(
+            self.root, text=f"Space: Toggle recording | Del: Discard pending | Esc: {esc_action}"
+        ).pack(pady=5)
+
+        self.ui.start(self.update_meter_display)
 
     def start_whisper_server(self):
-        try:
-            conn = http.client.HTTPConnection("127.0.0.1", self.SERVER_PORT)
-            conn.request("GET", "/inference")
-            conn.getresponse()
-            self.update_STATUS_display("[INFO] Whisper server is already running\n")
-        except (http.client.HTTPException, ConnectionRefusedError, socket.error):
-            cmd = f"{self.WHISPER_SERVER_PATH} -m {self.WHISPER_MODEL_PATH} --port {self.SERVER_PORT}"
-            print(f"Executing: {cmd}")
-            self.status_label.config(text="Starting Whisper server...")
-            self.update_STATUS_display("[INFO] Starting Whisper server...\n")
-            self.cleanup_temp_files()
-
-            # Fork a process to run the Whisper server
-            pid = os.fork()
-            if pid == 0:  # Child process
-                try:
-                    # Set up death signal - child will receive SIGTERM when parent dies
-                    # prctl.set_pdeathsig(signal.SIGTERM)
-                    
-                    # Redirect stdout and stderr to /dev/null
-                    with open(os.devnull, "w") as devnull:
-                        os.dup2(devnull.fileno(), 1)
-                        os.dup2(devnull.fileno(), 2)
-                    # Execute the Whisper server command with correct path
-                    os.execv(
-                        self.WHISPER_SERVER_PATH,
-                        [
-                            self.WHISPER_SERVER_PATH,
-                            "-m",
-                            self.WHISPER_MODEL_PATH,
-                            "--port",
-                            str(self.SERVER_PORT),
-                        ],
-                    )
-                except Exception as e:
-                    print(f"Child process error: {e}")
-                    os._exit(1)  # Use os._exit in child process
-            else:  # Parent process
-                # Store the PID to terminate it later if needed
-                self.whisper_server_pid = pid
-                # Wait for server to start (max 30 seconds)
-                start_time = time.time()
-                while time.time() - start_time < 30:
-                    try:
-                        time.sleep(2)  # Give the server some time to start
-                        conn = http.client.HTTPConnection("127.0.0.1", self.SERVER_PORT)
-                        conn.request("GET", "/inference")
-                        conn.getresponse()
-                        self.status_label.config(text="Server running")
-                        self.update_STATUS_display("[INFO] Whisper server started successfully\n")
-                        return
-                    except (
-                        http.client.HTTPException,
-                        ConnectionRefusedError,
-                        socket.error,
-                    ):
-                        self.update_STATUS_display("[INFO] Waiting for server to start...\n")
-                        time.sleep(1)
-                    except Exception as e:
-                        self.update_STATUS_display(f"[ERROR] checking server: {str(e)}\n")
-
-                # If we get here, server failed to start
-                self.status_label.config(text="Server start failed")
-                self.update_STATUS_display("[ERROR] Failed to start Whisper server\n")
-                self.root.update()
-                time.sleep(3)
-                self.on_closing()
+        """Hand the servers to the supervisor so the UI and capture start right away"""
+        self.service.start()
+
+    def set_status_label(self, text):
+        self.ui.call(self.status_label.config, {"text": text})
+
+    def on_server_change(self):
+        """Service callback: mirror the pool's state in the status label"""
+        states = {instance.state for instance in self.pool.required}
+        # Waiting for a server to load is not a stuck request
+        if self.service.ready.is_set():
+            self.pipeline.resume_deadlines()
+        else:
+            self.pipeline.pause_deadlines()
+        if self.service.ready.is_set():
+            self.set_status_label("Recording..." if self.RECORDING else "Server running")
+        elif states & {"starting", "restarting"}:
+            self.set_status_label("Starting Whisper server...")
+        elif self.service.failed:
+            # If we get here, no server could be started
+            self.set_status_label("Server start failed")
+            self.update_STATUS_display("[ERROR] Failed to start Whisper server\n")
+            self.ui.call(self.root.after, 3000, self.on_closing)
+        elif "idle" in states:
+            self.set_status_label("Recording (server unloaded)" if self.RECORDING else "Server unloaded")
 
     def toggle_recording(self):
         if self.RECORDING:
@@ -266,120 +2895,81 @@ class VoiceTypingGUI:
         self.RECORDING = True
         self.record_button.config(text="Stop Recording")
         self.status_label.config(text="Recording...")
-        self.recording_thread = threading.Thread(target=self.record_AUDIO, daemon=True)
-        self.recording_thread.start()
+        self.loop.call_soon_threadsafe(self.start_capture)
+        # The hotkey brings back a server that was unloaded while idle
+        self.supervisor.wake()
 
     def stop_recording(self):
         self.RECORDING = False
         self.record_button.config(text="Start Recording")
         self.status_label.config(text="Stopped")
-        cmd = "pkill -f 'rec -V -c 1'"
-        print(f"Executing: {cmd}")
+        # Only our own rec is signalled. It flushes and exits, and
+        # on_capture_exit hands the partial utterance on
+        self.loop.call_soon_threadsafe(self.stop_capture)
+
+    def start_capture(self):
+        """Loop callback: spawn rec streaming raw PCM to a non-blocking pipe"""
+        if self.capture is not None and self.capture.running:
+            return
+        cmd = ["rec", "-q", "-c", "1", "-r", str(SAMPLE_RATE), "-b", "16",
+               "-e", "signed-integer", "-t", "raw", "-"]
+        print(f"Executing: {' '.join(cmd)}")
+        # rec runs for the whole session; utterances are cut by self.vad
+        self.vad.reset(self.ring.position)
+        self.chunker.end(self.ring.position)
         try:
-            os.system(cmd)
-            # Process any remaining audio in the queue
-            if os.path.exists(self.current_audio_file):
-                self.AUDIO_queue.put(self.current_audio_file)
-        except Exception as e:
-            self.update_STATUS_display(f"Error stopping recording: {str(e)}\n")
-
-    def record_AUDIO(self):
-        self.current_audio_file = ""
-        while self.RECORDING:
-            tmp_FILE = f"/tmp/voice_{int(time.time())}.mp3"
-            self.current_audio_file = tmp_FILE
-            cmd = f"rec -V -c 1 -r 22050 -b 16 -e signed-integer -t mp3 {tmp_FILE} silence 1 0.2 3% 1 0.8 4%"
-            print(f"Executing: {cmd}")
-            self.update_STATUS_display(f"Recording to: {tmp_FILE}\n")
-
-            master, slave = pty.openpty()
-            pid = os.fork()
-            if pid == 0:
-                # Child process
-                os.dup2(slave, 0)
-                os.dup2(slave, 1)
-                os.dup2(slave, 2)
-                os.close(slave)
-                os.execvp(
-                    "rec",
-                    [
-                        "rec","-V","-c","1","-r","22050","-b","16","-e","signed-integer","-t","mp3","-e","signed-integer",
-                        "-t","mp3",tmp_FILE,"silence",
-                        "1","0.2",f"{THRESH_START}%",
-                        "1","0.8",f"{THRESH_START}%",
-                    ],
-                )
+            self.capture = ChildProcess(self.loop, cmd, self.on_audio, self.on_capture_exit)
+            STARTUP.mark("capture started")
+        except OSError as e:
+            self.update_STATUS_display(f"[ERROR] Could not start rec: {str(e)}\n")
+            self.capture = None
+
+    def stop_capture(self):
+        if self.capture is not None:
+            self.capture.send_signal(signal.SIGINT)
+
+    def on_audio(self, data):
+        """Loop callback: stream PCM into the ring and let the VAD cut utterances"""
+        self.ring.write(data)
+        self.ui.set_meter(self.meter.feed(data))
+        for kind, pos in self.vad.feed(data):
+            self.handle_vad_event(kind, pos)
+        if self.streamer is None:
+            # Long dictation is sent in chunks instead of waiting for a pause
+            piece = self.chunker.poll()
+            if piece:
+                self.submit_piece(*piece)
+
+    def on_capture_exit(self, returncode):
+        for kind, pos in self.vad.flush():
+            self.handle_vad_event(kind, pos)
+        self.capture = None
+        if self.RECORDING:
+            self.update_STATUS_display(f"[WARN] rec exited unexpectedly ({returncode})\n")
+
+    def handle_vad_event(self, kind, pos):
+        """Route VAD start/end events to the streamer or the chunker"""
+        if self.streamer:
+            # The streamer finishes the utterance from the same ring
+            if kind == "start":
+                self.streamer.begin(pos)
             else:
-                # Parent process
-                os.close(slave)
-
-                def read_output():
-                    while True:
-                        try:
-                            data = os.read(master, 1024).decode(
-                                "utf-8", errors="ignore"
-                            )
-                            if not data:
-                                break
-                            for line in data.splitlines():
-                                self.root.after(
-                                    0, self.update_recording_display, line + "\n"
-                                )
-                        except OSError:
-                            # Handle Input/output error gracefully
-                            break
-
-                thread = threading.Thread(target=read_output, daemon=True)
-                thread.start()
-
-                while self.RECORDING and thread.is_alive():
-                    time.sleep(0.1)
-
-                if self.RECORDING:
-                    # User stopped recording, send SIGINT to rec
-                    os.kill(pid, signal.SIGINT)
-
-                thread.join()
-                os.waitpid(pid, 0)
-
-                if os.path.exists(tmp_FILE):
-                    self.AUDIO_queue.put(tmp_FILE)
-
-    def parse_volume(self, line):
-        pattern = r"\[ (.*?)\|.*?\].*"
-        match = re.search(pattern, line)
-        if match:
-            left_bar = match.group(1).strip()
-            if "-" in left_bar:
-                parts = left_bar.split("-", maxsplit=1)
-                if len(parts) == 2:
-                    equals_count = parts[1].count("=")
-                    if equals_count > 4:
-                        equals_count = 4
-                    volume_percent = (equals_count / 4) * 100
-                    return volume_percent
-        return 0
-    
-    def cleanup_temp_files(self):
-        """Clean up any voice temp files that might have been left behind"""
-        try:
-            temp_dir = "/tmp"
-            pattern = "voice_*.mp3"
-            count = 0
-            
-            for filename in os.listdir(temp_dir):
-                if fnmatch.fnmatch(filename, pattern):
-                    file_path = os.path.join(temp_dir, filename)
-                    try:
-                        os.remove(file_path)
-                        count += 1
-                    except Exception as e:
-                        self.update_STATUS_display(f"[ERROR] Failed to remove {file_path}: {str(e)}\n")
-            
-            if count > 0:
-                self.update_STATUS_display(f"[INFO] Cleaned up {count} temporary voice files\n")
-        except Exception as e:
-            self.update_STATUS_display(f"[ERROR] During cleanup: {str(e)}\n") 
+                self.streamer.end(pos)
+        elif kind == "start":
+            self.chunker.begin(pos)
+        else:
+            piece = self.chunker.end(pos)
+            if piece:
+                self.submit_piece(*piece)
+
+    def submit_piece(self, segment, start, end):
+        # Back-date speech start/end from how far behind the live stream they are
+        now = time.monotonic()
+        bytes_per_second = float(SAMPLE_RATE * SAMPLE_WIDTH)
+        segment.mark("speech_start", now - (self.ring.position - start) / bytes_per_second)
+        segment.mark("speech_end", now - (self.ring.position - end) / bytes_per_second)
+        segment.mark("endpoint", now)
+        self.pipeline.submit(segment)
 
     def update_volume_display(self, volume_percent, db):
         self.volume_bar["value"] = volume_percent
@@ -392,147 +2982,201 @@ class VoiceTypingGUI:
         else:
             self.volume_bar.configure(style="Blue.Horizontal.TProgressbar")
 
-        if volume_percent > 90:
-            self.update_STATUS_display("[WARN] Volume is very high!\n")
+    def update_meter_display(self, reading):
+        """Draw the latest LevelMeter reading; called by the UI pump"""
+        rms_db, peak_db, clipped = reading
+        volume_percent = 100.0 * (1 - rms_db / METER_FLOOR_DB)
+        self.update_volume_display(volume_percent, rms_db)
+        self.meter_label.config(text=f"peak {peak_db:.1f} dB | clipped {clipped}")
+        if clipped > self.clipped_shown:
+            self.update_STATUS_display("[WARN] Input is clipping, lower the mic gain\n")
+            self.clipped_shown = clipped
 
     def update_STATUS_display(self, text):
+        """Thread-safe; the text shows up on the next UI frame"""
         if not text.strip():
             return
-        # Print to console
-        print(text, end="")
-        self.status_display.insert(tk.END, text)
-        self.status_display.see(tk.END)
+        self.ui.append(self.status_display, text)
     
-    def update_recording_display(self, text):
-        if not text.strip():
-            return
-        # Print to console
-        print(text, end="")
-        if "In:" in text:
-            # Clear previous content first
-            self.status_display2.delete(1.0, tk.END)
-            # Insert only the current line
-            self.status_display2.insert(tk.END, text.strip())
-            self.status_display2.see(tk.END)
+    def refresh_latency_display(self):
+        text = self.tracer.summary() + "\n" + self.pipeline.summary()
+        if ROUTING_MODE:
+            text += "\n" + self.pool.summary()
+        self.latency_label.config(text=text)
 
     def update_transcribe_display(self, text):
-        # Print transcribed text to console
-        print(f"Transcribed: {text}", end="")
-        self.transcribe_display.insert(tk.END, text)
+        """Thread-safe; the text shows up on the next UI frame"""
+        self.ui.append(self.transcribe_display, text, console=f"Transcribed: {text}")
+
+    def update_stream_display(self, delta, tail, final):
+        """Append committed words and redraw the provisional tail"""
+        ranges = self.transcribe_display.tag_ranges("provisional")
+        if ranges:
+            self.transcribe_display.delete(ranges[0], ranges[-1])
+        if delta:
+            if CONSOLE_ECHO:
+                print(f"Transcribed: {delta}")
+            self.transcribe_display.insert(tk.END, delta)
+        if final:
+            self.transcribe_display.insert(tk.END, "\n")
+            self.ui.trim(self.transcribe_display)
+        elif tail:
+            self.transcribe_display.insert(tk.END, " " + tail, "provisional")
         self.transcribe_display.see(tk.END)
 
-    def process_audio_queue(self):
-        while True:
-            audio_file = self.AUDIO_queue.get()
+    def type_text(self, text):
+        self.typer.type(text)
+
+    def erase_text(self, count):
+        self.typer.erase(count)
+
+    def commit_text(self, segment, text):
+        """Pipeline commit step, called in speaking order"""
+        segment.mark("committed")
+        self.update_transcribe_display(f"{text}\n")
+
+        def typed():
+            segment.mark("typed")
+            self.tracer.finish(segment)
+            self.ui.call(self.refresh_latency_display)
+
+        self.typer.type(text, on_done=typed)
+
+    def accept_command(self):
+        """Loop callback: a later invocation connected to the singleton socket"""
+        try:
+            conn, _ = singleton_socket.accept()
+        except (BlockingIOError, OSError):
+            return
+        if peer_uid(conn) != os.getuid():
+            # The directory is private; this is only a second line of defence
+            conn.close()
+            return
+        conn.setblocking(False)
+        buffer = bytearray()
+        # Drop clients that never finish their line
+        timer = self.loop.call_later(1.0, lambda: finish(None))
+
+        def finish(reply):
+            self.loop.cancel(timer)
+            self.loop.unwatch(conn)
+            if reply is not None:
+                try:
+                    conn.send(reply)
+                except OSError as e:
+                    print(f"Command connection error: {e}")
+            conn.close()
+
+        def readable():
             try:
-                with open(audio_file, "rb") as f:
-                    file_data = f.read()
-
-                # Create a boundary for multipart form data
-                boundary = "----WebKitFormBoundary7MA4YWxkTrZu0gW"
-
-                # Prepare the multipart form data
-                body = b""
-                # Add the form field
-                body += f"--{boundary}\r\n".encode()
-                body += f'Content-Disposition: form-data; name="temperature"\r\n\r\n'.encode()
-                body += f"0.0\r\n".encode()
-                body += f"--{boundary}\r\n".encode()
-                body += f'Content-Disposition: form-data; name="response-format"\r\n\r\n'.encode()
-                body += f"json\r\n".encode()
-                # Add the file
-                body += f"--{boundary}\r\n".encode()
-                body += f'Content-Disposition: form-data; name="file"; filename="{os.path.basename(audio_file)}"\r\n'.encode()
-                body += f"Content-Type: audio/mpeg\r\n\r\n".encode()
-                body += file_data
-                body += f"\r\n--{boundary}--\r\n".encode()
-
-                # Set up the connection
-                conn = http.client.HTTPConnection("127.0.0.1", self.SERVER_PORT)
-                headers = {
-                    "Content-Type": f"multipart/form-data; boundary={boundary}",
-                    "Content-Length": str(len(body)),
-                }
-
-                # Send the request
-                conn.request("POST", "/inference", body=body, headers=headers)
-                response = conn.getresponse()
-                response_data = response.read().decode("utf-8")
-                response_data = json.loads(response_data)
-                
-                if "text" not in response_data:
-                    self.root.after(0, self.update_STATUS_display, "[WARN] empty response\n")
-                    continue
+                data = conn.recv(256)
+            except BlockingIOError:
+                return
+            except OSError:
+                data = b""
+            buffer.extend(data)
+            if b"\n" not in buffer and data and len(buffer) < 256:
+                return
+            if not buffer:
+                finish(None)  # Only checking that we are running
+                return
+            command = buffer.split(b"\n")[0].decode(errors="replace").strip()
+            if command in COMMANDS:
+                self.ui.call(self.handle_command, command)
+                finish(b"ok\n")
+            else:
+                finish(f"unknown command: {command}\n".encode())
 
-                text = response_data["text"].strip().replace("\n", " ")
-                # Remove text enclosed in double asterisks (sound dictation)
-                text = re.sub(r"\*.*?\*", "", text)
-                if len(text) > 15 or "hank you" not in text:
-                    self.root.after(0, self.update_transcribe_display, f"{text}\n")
-                    for char in text:
-                        self.keyboard.tap(char)
-                        time.sleep(0.01)
-            except Exception as e:
-                self.root.after(0, self.update_STATUS_display, f"[ERROR] Error: {str(e)}\n")
-            finally:
-                # Always attempt to remove the file, even if processing failed
-                if os.path.exists(audio_file):
-                    try:
-                        os.remove(audio_file)
-                        self.root.after(0, self.update_STATUS_display, f"[INFO] Removed temp file: {audio_file}\n")
-                    except Exception as e:
-                        self.root.after(0, self.update_STATUS_display, f"[ERROR] Failed to remove temp file {audio_file}: {str(e)}\n")
-                self.AUDIO_queue.task_done()
-
-            # Restart recording if it was stopped due to silence detection
-            if self.RECORDING and not self.recording_thread.is_alive():
-                self.recording_thread = threading.Thread(
-                    target=self.record_AUDIO, daemon=True
-                )
-                self.recording_thread.start()
+        self.loop.watch(conn, selectors.EVENT_READ, readable)
+
+    def handle_command(self, command):
+        visible = self.root.state() != "withdrawn"
+        if command == "toggle":
+            command = "hide" if visible else "show"
+
+        if command == "show":
+            self.root.deiconify()
+            self.root.lift()
+            self.root.focus_force()
+            if not self.RECORDING:
+                self.start_recording()
+        elif command == "hide":
+            if self.RECORDING:
+                self.stop_recording()
+            self.root.withdraw()
+        elif command == "start":
+            if not self.RECORDING:
+                self.start_recording()
+        elif command == "stop":
+            if self.RECORDING:
+                self.stop_recording()
+        elif command == "discard":
+            self.discard_pending()
+        elif command == "quit":
+            self.on_closing()
+
+    def discard_pending(self):
+        """Drop queued and in-flight segments and untyped text"""
+        count = self.pipeline.cancel_all()
+        if self.streamer is None:
+            # The streamer tracks what is on screen, so its jobs must run
+            count += self.typer.discard()
+        self.update_STATUS_display(f"[INFO] Discarded {count} pending segment(s)\n")
+        self.ui.call(self.refresh_latency_display)
+
+    def on_escape(self):
+        # Nothing queued before Escape should be typed afterwards
+        self.discard_pending()
+        if DAEMON_MODE:
+            self.handle_command("hide")
+        else:
+            self.on_closing()
 
     def on_closing(self):
         self.RECORDING = False
-        self.cleanup_temp_files()
-        
-        # Terminate the Whisper server if we started it (as a backup)
-        if hasattr(self, 'whisper_server_pid'):
-            try:
-                pass
-                # os.kill(self.whisper_server_pid, signal.SIGTERM)
-                # self.update_STATUS_display("[INFO] Terminated Whisper server\n")
-            except ProcessLookupError:
-                # Process already terminated
-                pass
-            except Exception as e:
-                print(f"Error terminating Whisper server: {e}")
+        if self.capture is not None:
+            self.capture.send_signal(signal.SIGINT)
         
+        # Stop the Whisper servers we started unless other clients use them
+        self.service.shutdown()
+
+        self.loop.stop()
         self.root.destroy()
 
+    def config_text(self):
+        ports = [instance.port for instance in self.pool.required]
+        port = f"{ports[0]}-{ports[-1]}" if len(ports) > 1 else str(ports[0])
+        if ROUTING_MODE:
+            port += f", small {SMALL_SERVER_PORT}"
+        model = f"{SMALL_MODEL} <= {ROUTE_MAX_SECONDS:g}s < {self.MODEL}" if ROUTING_MODE else self.MODEL
+        return (
+            f"Model: {model} | Port: {port} | "
+            f"Thresholds: {THRESH_START}% | End: {END_SILENCE_MS}ms"
+        )
+
     def update_thresholds(self):
-        """Update the threshold values based on user input"""
+        """Update the VAD threshold and end-of-speech timeout from user input"""
         try:
-            # Get values from entry fields and convert to float
+            # Get values from entry fields
             new_start = float(self.thresh_var.get())
-            new_end = float(self.thresh_var.get())
+            new_end_ms = int(float(self.end_var.get()))
+            if new_end_ms < VAD_FRAME_MS:
+                raise ValueError
             
             # Update global variables
-            global THRESH_START, THRESH_END
+            global THRESH_START, END_SILENCE_MS
             THRESH_START = new_start
-            THRESH_END = new_end
+            END_SILENCE_MS = new_end_ms
+
+            # The VAD reads these per frame, so capture keeps running
+            self.vad.threshold = THRESH_START
+            self.vad.end_silence_ms = END_SILENCE_MS
             
             # Update the configuration label
-            self.config_label.config(
-                text=f"Model: {self.MODEL} | Port: {self.SERVER_PORT} | Thresholds: {THRESH_START}%"
-            )
+            self.config_label.config(text=self.config_text())
             
             # Update the display
-            self.update_STATUS_display(f"[INFO] Thresholds updated: Start={THRESH_START}, End={THRESH_END}\n")
-            
-            # If recording is active, restart it to apply new thresholds
-            if self.RECORDING:
-                self.stop_recording()
-                self.start_recording()
+            self.update_STATUS_display(f"[INFO] Thresholds updated: Start={THRESH_START}%, End={END_SILENCE_MS}ms\n")
         except ValueError:
             self.update_STATUS_display("[ERROR] Please enter valid numbers for thresholds\n")
 
@@ -551,22 +3195,407 @@ class VoiceTypingGUI:
             self.update_STATUS_display("[ERROR] Invalid threshold value\n")
 
 
-def is_already_running():
-    """Check if another instance is running using socket binding"""
+AUDIO_EXTENSIONS = (".wav", ".flac", ".mp3", ".ogg", ".opus", ".m4a")
+
+
+def find_audio_files(inputs):
+    """Expand files, directories and glob patterns into a sorted file list"""
+    paths = []
+    for item in inputs:
+        matches = sorted(glob.glob(item, recursive=True)) if glob.has_magic(item) else [item]
+        for path in matches:
+            if os.path.isdir(path):
+                for dirpath, _, filenames in sorted(os.walk(path)):
+                    paths.extend(
+                        os.path.join(dirpath, name) for name in sorted(filenames)
+                        if name.lower().endswith(AUDIO_EXTENSIONS)
+                    )
+            else:
+                paths.append(path)
+    return paths
+
+
+def transcribe_files(paths, service, out, output_format="jsonl", jobs=INFERENCE_WORKERS,
+                     on_status=print):
+    """Transcribe files through the live pipeline; returns (files, audio seconds, failures).
+
+    Long files are cut into overlapping chunks like continuous dictation,
+    chunks of all files are transcribed `jobs` at a time, and each file's
+    result is written as soon as everything before it is committed. A
+    file that could not be read or had a chunk fail counts as failed.
+    """
+    texts = {}  # File index -> committed chunk texts
+    state = {"written": 0}
+    durations = [0.0] * len(paths)
+    errors = {}
+    lock = threading.Lock()
+
+    def write_through(index):
+        # Commits are in order, so every file before `index` is complete
+        with lock:
+            while state["written"] < index:
+                i = state["written"]
+                text = " ".join(texts.pop(i, []))
+                if output_format == "jsonl":
+                    record = {"file": paths[i], "duration": round(durations[i], 2), "text": text}
+                    if i in errors:
+                        record["error"] = errors[i]
+                    out.write(json.dumps(record) + "\n")
+                elif i not in errors:
+                    out.write(f"# {paths[i]}\n{text}\n\n")
+                out.flush()
+                state["written"] += 1
+
+    def commit(segment, text):
+        texts.setdefault(segment.source, []).append(text.strip())
+        write_through(segment.source)
+
+    def transcribe(segment):
+        try:
+            return service.transcribe(segment)
+        except Exception as e:
+            # Recorded before the pipeline moves past the chunk, so before
+            # the file's record can be written
+            with lock:
+                errors.setdefault(segment.source, str(e))
+            raise
+
+    pipeline = TranscriptionPipeline(
+        transcribe, commit, on_status=on_status,
+        # Long files queue up by design; only the read timeout applies
+        workers=jobs, max_pending=float("inf"), deadline=None,
+    )
+    for index, path in enumerate(paths):
+        try:
+            pcm = load_audio(path)
+        except OSError as e:
+            errors[index] = str(e)
+            on_status(f"[ERROR] {str(e)}\n")
+            continue
+        durations[index] = len(pcm) / float(SAMPLE_RATE * SAMPLE_WIDTH)
+        for segment in split_pcm(pcm):
+            segment.source = index
+            # Keep only a few chunks decoded ahead of the workers
+            pipeline.wait_pending(2 * jobs)
+            pipeline.submit(segment)
+    pipeline.wait_idle()
+    write_through(len(paths))
+    return len(paths), sum(durations), len(errors)
+
+
+def batch_main(argv):
+    """`client.py transcribe`: headless transcription of audio files"""
+    parser = argparse.ArgumentParser(
+        prog="client.py transcribe",
+        description="Transcribe audio files with whisper-server, without the GUI",
+    )
+    parser.add_argument("inputs", nargs="+", help="audio files, directories or glob patterns")
+    parser.add_argument("-j", "--jobs", type=int, default=INFERENCE_WORKERS,
+                        help="segments transcribed at once (default: %(default)s)")
+    parser.add_argument("-f", "--format", choices=("jsonl", "text"), default="jsonl",
+                        help="output format (default: %(default)s)")
+    parser.add_argument("-o", "--output", help="write results here instead of stdout")
+    parser.add_argument("--quiet", action="store_true", help="only print errors and the summary")
+    args = parser.parse_args(argv)
+
+    paths = find_audio_files(args.inputs)
+    if not paths:
+        parser.error("no audio files found")
+
+    def on_status(text):
+        if not args.quiet or text.startswith("[ERROR]"):
+            sys.stderr.write(text)
+
+    loop = EventLoop()
+    loop.start()
+    service = TranscriptionService(loop, on_status=on_status)
+    service.start()
+    out = open(args.output, "w") if args.output else sys.stdout
+    start = time.monotonic()
     try:
-        # Try to create and bind a socket
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        sock.bind(("127.0.0.1", SINGLETON_PORT))
-        sock.listen(1)
+        # Wait for the server here, so a failed start does not hang the run
+        while not service.ready.wait(0.2):
+            if service.failed:
+                sys.stderr.write("[ERROR] Failed to start Whisper server\n")
+                return 1
+        files, audio_seconds, failures = transcribe_files(
+            paths, service, out, args.format, max(1, args.jobs), on_status
+        )
+    finally:
+        if out is not sys.stdout:
+            out.close()
+        service.shutdown()
+        loop.stop()
+    wall = time.monotonic() - start
+    sys.stderr.write(
+        f"[INFO] {files} files ({failures} failed), {audio_seconds / 3600:.2f} h of audio in {wall:.1f}s: "
+        f"{files / wall:.2f} files/s, {audio_seconds / wall:.1f} audio-hours per hour\n"
+    )
+    return 1 if failures else 0
+
+
+def word_error_rate(reference, hypothesis):
+    """Word-level edit distance over the reference length, ignoring case and punctuation"""
+    def words(text):
+        return re.sub(r"[^\w\s']", " ", text.lower()).split()
+
+    ref, hyp = words(reference), words(hypothesis)
+    if not ref:
+        return 0.0 if not hyp else 1.0
+    row = list(range(len(hyp) + 1))
+    for i, word in enumerate(ref, 1):
+        prev, row[0] = row[0], i
+        for j, other in enumerate(hyp, 1):
+            prev, row[j] = row[j], min(row[j] + 1, row[j - 1] + 1, prev + (word != other))
+    return row[-1] / float(len(ref))
+
+
+def default_thread_grid():
+    ncpu = os.cpu_count() or 1
+    grid = {ncpu}
+    threads = 2
+    while threads < ncpu:
+        grid.add(threads)
+        threads *= 2
+    return sorted(grid)
+
+
+def free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def measure_server_settings(loop, server_path, model_path, settings, clips, rounds, on_status):
+    """Launch a server with `settings` and time `rounds` passes over clips.
+
+    Returns (seconds per request, first-pass transcripts), or None if the
+    server did not start or a request failed. The server is stopped
+    before returning.
+    """
+    pool = ServerPool(free_port(), count=1, threads=None, model_path=model_path)
+    instance = pool.instances[0]
+    instance.settings = settings
+    changed = threading.Event()
+    supervisor = ServerSupervisor(loop, pool, server_path, model_path, on_status, changed.set)
+    loop.call_soon_threadsafe(supervisor.launch, instance)
+    try:
+        while instance.state not in ("up", "failed"):
+            changed.wait(0.5)
+            changed.clear()
+        if instance.state != "up":
+            return None
+        client = InferenceClient("127.0.0.1", instance.port)
+        elapsed = []
+        texts = []
+        try:
+            # One untimed request so the first timed one is not special
+            client.infer(clips[0][0], "calibrate.wav")
+            for round_index in range(rounds):
+                for parts, _ in clips:
+                    start = time.perf_counter()
+                    response = client.infer(parts, "calibrate.wav")
+                    elapsed.append(time.perf_counter() - start)
+                    if not round_index:
+                        texts.append(clean_transcript(response.get("text", "")))
+        except (http.client.HTTPException, OSError, ServerError) as e:
+            on_status(f"[ERROR] Request failed: {str(e)}\n")
+            return None
+        finally:
+            client.close()
+        return elapsed, texts
+    finally:
+        supervisor.drop_lease(instance)
+        loop.call_soon_threadsafe(supervisor.stop, instance, "exit")
+        # Let it exit so it does not compete with the next setting
+        deadline = time.monotonic() + 10.0
+        while instance.process is not None and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+
+def int_list(text):
+    try:
+        values = [int(item) for item in text.split(",")]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected comma-separated integers, got {text!r}")
+    if any(value < 1 for value in values):
+        raise argparse.ArgumentTypeError("values must be at least 1")
+    return values
+
+
+def calibrate_main(argv):
+    """`client.py calibrate`: find the fastest whisper-server settings for this machine"""
+    parser = argparse.ArgumentParser(
+        prog="client.py calibrate",
+        description="Time whisper-server over a grid of threads, processors and beam sizes "
+                    f"and save the fastest accurate setting to {SERVER_CONFIG_FILE}",
+    )
+    parser.add_argument("inputs", nargs="*", default=CALIBRATE_AUDIO,
+                        help="audio files, directories or glob patterns (default: %(default)s)")
+    parser.add_argument("--model", default=WHISPER_MODEL_PATH, help="model to calibrate (default: %(default)s)")
+    parser.add_argument("--server", default=WHISPER_SERVER_PATH, help="whisper-server binary")
+    parser.add_argument("--threads", type=int_list, default=CALIBRATE_THREADS or default_thread_grid(),
+                        help="thread counts to try, e.g. 4,8 (default: %(default)s)")
+    parser.add_argument("--processors", type=int_list, default=CALIBRATE_PROCESSORS,
+                        help="processor counts to try (default: %(default)s)")
+    parser.add_argument("--beam-sizes", type=int_list, default=CALIBRATE_BEAM_SIZES,
+                        help="beam sizes to try; 1 = greedy (default: %(default)s)")
+    parser.add_argument("--rounds", type=int, default=CALIBRATE_ROUNDS,
+                        help="timed passes over the audio per setting (default: %(default)s)")
+    parser.add_argument("--max-wer", type=float, default=CALIBRATE_MAX_WER,
+                        help="largest word error rate against the reference setting (default: %(default)s)")
+    parser.add_argument("--dry-run", action="store_true", help="print the results without saving them")
+    args = parser.parse_args(argv)
 
-        # Store socket as attribute to prevent garbage collection
-        global singleton_socket
-        singleton_socket = sock
+    paths = find_audio_files(args.inputs)
+    if not paths:
+        parser.error("no audio files found")
+    clips = []
+    for path in paths:
+        try:
+            segment = AudioSegment(load_audio(path))
+        except OSError as e:
+            parser.error(str(e))
+        clips.append((segment.wav_parts(), segment.duration))
+    audio_seconds = sum(duration for _, duration in clips) * max(1, args.rounds)
+
+    # The reference (largest beam, one processor) runs first; more
+    # processors than cores only oversubscribe the machine
+    ncpu = os.cpu_count() or 1
+    grid = [
+        {"threads": threads, "processors": processors, "beam_size": beam_size}
+        for beam_size in sorted(set(args.beam_sizes), reverse=True)
+        for processors in sorted(set(args.processors))
+        for threads in sorted(set(args.threads), reverse=True)
+        if processors == 1 or threads * processors <= ncpu
+    ]
+
+    def on_status(text):
+        if not text.startswith("[INFO]"):
+            sys.stderr.write(text)
+
+    import_http()
+    loop = EventLoop()
+    loop.start()
+    results = []
+    reference = None
+    try:
+        for index, settings in enumerate(grid, 1):
+            sys.stderr.write(
+                f"[INFO] {index}/{len(grid)}: {settings['threads']} threads, "
+                f"{settings['processors']} processors, beam size {settings['beam_size']}\n"
+            )
+            measured = measure_server_settings(
+                loop, args.server, args.model, settings, clips, max(1, args.rounds), on_status
+            )
+            if measured is None:
+                continue
+            elapsed, texts = measured
+            if reference is None:
+                reference = " ".join(texts)
+            # Unrounded, so near-ties are still decided by the measurement
+            results.append(dict(
+                settings,
+                latency_ms=1000.0 * sum(elapsed) / len(elapsed),
+                rtf=sum(elapsed) / audio_seconds,
+                wer=word_error_rate(reference, " ".join(texts)),
+            ))
+    except KeyboardInterrupt:
+        sys.stderr.write("[WARN] Interrupted; reporting the settings measured so far\n")
+    finally:
+        loop.stop()
+    if not results:
+        sys.stderr.write("[ERROR] No setting could be measured\n")
+        return 1
+
+    accurate = [result for result in results if result["wer"] <= args.max_wer]
+    best = min(accurate, key=lambda result: result["rtf"])
+    print(f"{len(clips)} clips, {audio_seconds / max(1, args.rounds):.1f}s of audio, {args.model}")
+    print(f"{'threads':>7} {'procs':>5} {'beam':>4} {'latency ms':>10} {'RTF':>7} {'WER':>6}")
+    for result in sorted(results, key=lambda result: result["rtf"]):
+        print(
+            f"{result['threads']:>7} {result['processors']:>5} {result['beam_size']:>4} "
+            f"{result['latency_ms']:>10.1f} {result['rtf']:>7.3f} {result['wer']:>6.3f}"
+            + (" *" if result is best else "")
+        )
+    if args.dry_run:
+        return 0
+    best = dict(
+        best, latency_ms=round(best["latency_ms"], 1), rtf=round(best["rtf"], 4), wer=round(best["wer"], 4),
+        cpu_count=ncpu, calibrated=time.strftime("%Y-%m-%d %H:%M:%S"),
+    )
+    try:
+        save_server_settings(args.model, best)
+    except OSError as e:
+        sys.stderr.write(f"[ERROR] Could not save settings: {str(e)}\n")
+        return 1
+    sys.stderr.write(f"[INFO] Saved to {SERVER_CONFIG_FILE}; restart voicekbd to use them\n")
+    return 0
+
+
+singleton_socket = None
+
+
+def private_dir(path):
+    """Create `path` as a directory only we can use; raises OSError if it is not ours"""
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    st = os.lstat(path)
+    if not os.path.isdir(path) or os.path.islink(path) or st.st_uid != os.getuid():
+        raise OSError(errno.EPERM, f"{path} is not a directory owned by us")
+    if st.st_mode & 0o077:
+        os.chmod(path, 0o700)
+
+
+def peer_uid(conn):
+    """uid of the process at the other end of an AF_UNIX connection"""
+    creds = conn.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i"))
+    return struct.unpack("3i", creds)[1]
+
+
+def is_already_running():
+    """Claim the command socket; True if a running instance already holds it"""
+    global singleton_socket
+    try:
+        private_dir(os.path.dirname(SINGLETON_SOCKET))
+    except OSError as e:
+        print(f"[WARN] Commands disabled: {str(e)}", file=sys.stderr)
         return False
-    except socket.error:
-        # Port is in use, meaning another instance is running
-        return True
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.bind(SINGLETON_SOCKET)
+    except OSError:
+        if send_command(None) is not None:
+            sock.close()
+            return True
+        # Left behind by an instance that did not exit cleanly
+        try:
+            os.remove(SINGLETON_SOCKET)
+            sock.bind(SINGLETON_SOCKET)
+        except OSError:
+            sock.close()
+            return True
+    sock.listen(5)
+    # Keep a reference so the socket is not garbage collected
+    singleton_socket = sock
+    return False
+
+
+def send_command(command):
+    """Send a command to the running instance; returns its reply or None.
+
+    With command None this only checks that something accepts connections.
+    """
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(1.0)
+            sock.connect(SINGLETON_SOCKET)
+            if command is None:
+                return ""
+            sock.sendall(f"{command}\n".encode())
+            return sock.makefile("r").readline().strip()
+    except (socket.error, socket.timeout):
+        return None
+
     
 def activate_existing_window():
     """Try to bring the existing window to the foreground"""
@@ -579,11 +3608,64 @@ def activate_existing_window():
 
 
 if __name__ == "__main__":
+    if sys.argv[1:2] == ["transcribe"]:
+        sys.exit(batch_main(sys.argv[2:]))
+    if sys.argv[1:2] == ["calibrate"]:
+        sys.exit(calibrate_main(sys.argv[2:]))
+
+    parser = argparse.ArgumentParser(
+        description="Voice keyboard using whisper.cpp",
+        epilog="Run `client.py transcribe --help` to transcribe audio files without the GUI, "
+               "and `client.py calibrate --help` to tune the whisper-server settings.",
+    )
+    parser.add_argument(
+        "command", nargs="?", default="show", choices=COMMANDS,
+        help="command for an already running instance (default: show)",
+    )
+    parser.add_argument(
+        "--daemon", action="store_true",
+        help="stay resident; Escape hides the window instead of quitting",
+    )
+    parser.add_argument(
+        "--quiet", action="store_true",
+        help="do not echo status and transcripts to the console",
+    )
+    parser.add_argument(
+        "--trace", metavar="FILE",
+        help="append per-segment latency spans to FILE as JSON lines",
+    )
+    parser.add_argument(
+        "--profile-startup", action="store_true",
+        help="print how long imports and each startup phase took",
+    )
+    args = parser.parse_args()
+    PROFILE_STARTUP = args.profile_startup
+    STARTUP.mark("imports, args")
+    DAEMON_MODE = args.daemon
+    CONSOLE_ECHO = not args.quiet
+    if args.trace:
+        TRACE_FILE = args.trace
+
     if is_already_running():
-        print("Another instance is already running!")
-        activate_existing_window()
-        sys.exit(1)
+        reply = send_command(args.command)
+        STARTUP.mark("command sent")
+        STARTUP.report()
+        if reply is None:
+            print("Another instance is already running!")
+            activate_existing_window()
+            sys.exit(1)
+        if reply != "ok":
+            print(reply)
+            sys.exit(1)
+        sys.exit(0)
+
+    if args.command in ("hide", "stop", "discard", "quit"):
+        # Nothing to act on
+        sys.exit(0)
 
+    import_tk()
+    STARTUP.mark("import tkinter")
     root = tk.Tk()
+    STARTUP.mark("Tk root")
     app = VoiceTypingGUI(root)
     root.mainloop()
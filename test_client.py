@@ -0,0 +1,104 @@
+"""Unit tests for client.py that need no server, microphone or display.
+
+Run with `python3 -m unittest` (or pytest).
+"""
+import unittest
+
+import client
+
+BYTES_PER_SECOND = client.SAMPLE_RATE * client.SAMPLE_WIDTH
+
+
+class SpanRing:
+    """Stands in for PCMRingBuffer: read() hands back the span itself"""
+
+    def read(self, start, end):
+        return (start, end)
+
+
+def dictate(words, rate, seconds, interval=0.5):
+    """Stream `words` spoken at `rate` words/s through a perfect transcriber.
+
+    Returns (typed text, words committed per non-final tick).
+    """
+    def transcribe(span):
+        start, end = span
+        # A word is heard when its midpoint falls inside the window
+        return " ".join(
+            word for i, word in enumerate(words)
+            if start <= (i + 0.5) / rate * BYTES_PER_SECOND < end
+        )
+
+    typed = []
+    commits = []
+
+    def on_update(delta, provisional, final):
+        if not final:
+            commits.append(len(delta.split()))
+
+    def on_erase(count):
+        del typed[:]  # Nothing here should ever need erasing
+        typed.append(f"<erased {count}>")
+
+    streamer = client.StreamingTranscriber(SpanRing(), transcribe, on_update, typed.append, on_erase)
+    streamer.utterance_start = 0
+    tick = interval
+    while tick < seconds:
+        streamer.tick(int(tick * BYTES_PER_SECOND), final=False)
+        tick += interval
+    streamer.tick(int(seconds * BYTES_PER_SECOND), final=True)
+    return "".join(typed), commits
+
+
+class StreamingTranscriberTest(unittest.TestCase):
+    def test_long_dictation_is_typed_once(self):
+        # Well past STREAM_WINDOW_SECONDS at normal speaking rates, so the
+        # window holds more committed words than a fixed search would allow
+        for rate in (2.5, 2.75, 3.0):
+            for seconds in range(16, 40):
+                words = [f"w{i}" for i in range(int(rate * seconds))]
+                with self.subTest(rate=rate, seconds=seconds):
+                    typed, commits = dictate(words, rate, seconds)
+                    self.assertEqual(typed, " ".join(words))
+                    # Commits keep pace instead of stalling and bursting
+                    self.assertLessEqual(max(commits), 3)
+
+    def test_unaligned_final_tick_types_nothing_new(self):
+        streamer = client.StreamingTranscriber(
+            SpanRing(), lambda span: "something else entirely", lambda *args: None,
+            lambda text: self.fail(f"typed {text!r}"), lambda count: self.fail("erased"),
+        )
+        streamer.utterance_start = 0
+        streamer.committed = ["already", "typed", "words"]
+        streamer.screen = "already typed words"
+        window = client.STREAM_WINDOW_SECONDS * BYTES_PER_SECOND
+        streamer.tick(window + BYTES_PER_SECOND, final=True)
+
+
+class SplitPcmTest(unittest.TestCase):
+    def test_chunks_cover_the_recording_lazily(self):
+        pcm = bytes(int(30 * BYTES_PER_SECOND))
+        chunks = client.split_pcm(pcm)
+        self.assertFalse(isinstance(chunks, list))
+        chunks = list(chunks)
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(sum(len(c.pcm) - c.overlap for c in chunks), len(pcm))
+
+
+class AlignCommittedTailTest(unittest.TestCase):
+    def test_finds_tail_after_a_clipped_first_word(self):
+        committed = "so this is what we decided to do".split()
+        words = "sid to do next week".split()
+        self.assertEqual(client.align_committed_tail(committed, words), ["next", "week"])
+
+    def test_tail_longer_than_thirty_words(self):
+        committed = [f"w{i}" for i in range(60)]
+        words = committed[15:] + ["new"]
+        self.assertEqual(client.align_committed_tail(committed, words), ["new"])
+
+    def test_no_overlap(self):
+        self.assertIsNone(client.align_committed_tail(["a", "b", "c"], ["x", "y", "z"]))
+
+
+if __name__ == "__main__":
+    unittest.main()